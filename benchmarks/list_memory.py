@@ -0,0 +1,123 @@
+"""
+Peak memory of the list endpoints per 10k rows, before and after projection.
+
+    python -m benchmarks.list_memory --rows 10000
+
+"before" is the original read path: hydrate ORM objects, take each
+`__dict__` and validate a response model. "after" is the projection path the
+controllers use now. Both run against a throwaway SQLite database.
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from controllers.customer import CustomerResponse, CustomerSchema
+from controllers.menu_item import MenuItemResponse, MenuItemSchema
+from db.models import Base, Customer, MenuItem
+from db.projection import rows_to_json, select_rows
+
+
+def orm_path(session, model, response, *criteria):
+    rows = session.query(model).filter(*criteria).all()
+    rows_list = [row.__dict__ for row in rows]
+    return response(data=rows_list, count=len(rows_list)).model_dump_json()
+
+
+def projection_path(session, model, schema, *criteria):
+    keys, rows = select_rows(session, model, schema, *criteria)
+    return rows_to_json(keys, rows)
+
+
+def peak_kib(session, function, *args):
+    """Run `function` in a fresh session state and return its peak allocation."""
+    session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    function(session, *args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def populate(session, rows):
+    now = datetime.now(timezone.utc)
+    audit = {"created_at": now, "updated_at": now}
+    session.execute(
+        Customer.__table__.insert(),
+        [
+            {
+                "name": f"Customer {index}",
+                "phone_number": f"+91{9_000_000_000 + index}",
+                "email": f"customer{index}@example.com",
+                "created_by": "bench",
+                "updated_by": "bench",
+                **audit,
+            }
+            for index in range(rows)
+        ],
+    )
+    session.execute(
+        MenuItem.__table__.insert(),
+        [
+            {
+                "name": f"Menu item {index}",
+                "description": "A benchmark menu item with a realistic description.",
+                "price": 9.99,
+                "active": True,
+                "created_by": "bench",
+                "updated_by": "bench",
+                **audit,
+            }
+            for index in range(rows)
+        ],
+    )
+    session.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(
+            directory, "bench.db"
+        )
+        db = SQLAlchemy(app, session_options={"expire_on_commit": False})
+        with app.app_context():
+            Base.metadata.create_all(db.engine)
+            populate(db.session, args.rows)
+
+            per_10k = 10000 / args.rows
+            print(f"{'endpoint':<16}{'before KiB':>12}{'after KiB':>12}{'ratio':>8}")
+            for endpoint, model, schema, response, criteria in (
+                ("GET /customer/", Customer, CustomerSchema, CustomerResponse, ()),
+                (
+                    "GET /menu_item/",
+                    MenuItem,
+                    MenuItemSchema,
+                    MenuItemResponse,
+                    (MenuItem.active,),
+                ),
+            ):
+                before = per_10k * peak_kib(
+                    db.session, orm_path, model, response, *criteria
+                )
+                after = per_10k * peak_kib(
+                    db.session, projection_path, model, schema, *criteria
+                )
+                print(
+                    f"{endpoint:<16}{before:>12.0f}{after:>12.0f}{before / after:>7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
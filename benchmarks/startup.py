@@ -0,0 +1,191 @@
+"""
+Cold start time of `create_app()`, checked against a stored baseline.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --update-baseline
+
+Every run is a fresh interpreter started with `-X importtime`. It first
+imports the third-party packages the app is built on (`DEPENDENCIES`), then
+times the `main` import and `create_app()` separately. What the app adds on
+top of its dependencies is compared as a ratio of the dependency import
+time, so the check holds on slower or faster machines. The median ratio must
+stay within `--tolerance` of the one in startup_baseline.json, and modules
+that must stay out of startup (see `DEFERRED_MODULES`) are checked too.
+Exits with status 1 when either check fails. tests/test_startup.py runs the
+same checks under pytest (`pytest -m startup`). No database is needed;
+SQLite stands in unless `SQLALCHEMY_DATABASE_URI` is set.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+
+# Loaded on first use, never while a worker starts
+DEFERRED_MODULES = ("alembic",)
+
+# The floor the app's own startup cost is measured against
+DEPENDENCIES = ("flask", "flask_sqlalchemy", "sqlalchemy.orm", "pydantic")
+
+# Allowed growth of the app / dependencies ratio over the baseline
+TOLERANCE = 0.2
+
+PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+for name in {dependencies!r}:
+    importlib.import_module(name)
+dependencies = time.perf_counter()
+from main import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({{
+    "dependencies_ms": (dependencies - started) * 1000,
+    "import_ms": (imported - dependencies) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return {module: (self us, cumulative us)} from `-X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(env, cwd):
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            PROBE.format(dependencies=DEPENDENCIES),
+        ],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["importtime"] = parse_importtime(completed.stderr)
+    return result
+
+
+def measure(runs):
+    """
+    Start `runs` fresh interpreters and return their timings.
+
+    :return: The medians of the dependency import, `main` import and
+        `create_app()` times in ms and of the app / dependencies ratio, and
+        the results of the last run (importtime breakdown and loaded modules)
+    :rtype: dict
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("SQLALCHEMY_DATABASE_URI", "sqlite://")
+    env.setdefault("LOG_LEVEL", "WARNING")
+
+    # Run outside the repository so the logs directory lands somewhere disposable
+    with tempfile.TemporaryDirectory() as cwd:
+        env.setdefault("MENU_SNAPSHOT_DIR", cwd)
+        results = [run_once(env, cwd) for _ in range(runs)]
+
+    for result in results:
+        result["ratio"] = (result["import_ms"] + result["create_ms"]) / result[
+            "dependencies_ms"
+        ]
+    return {
+        **{
+            name: statistics.median(result[name] for result in results)
+            for name in ("dependencies_ms", "import_ms", "create_ms", "ratio")
+        },
+        "last": results[-1],
+    }
+
+
+def load_baseline():
+    """Return the stored app / dependencies ratio."""
+    with open(BASELINE) as f:
+        return json.load(f)["ratio"]
+
+
+def save_baseline(measured):
+    with open(BASELINE, "w") as f:
+        json.dump(
+            {
+                "ratio": round(measured["ratio"], 3),
+                "dependencies_ms": round(measured["dependencies_ms"]),
+                "app_ms": round(measured["import_ms"] + measured["create_ms"]),
+            },
+            f,
+            indent=2,
+        )
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Store the measured ratio as the new baseline",
+    )
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    measured = measure(args.runs)
+    app_ms = measured["import_ms"] + measured["create_ms"]
+    print(f"dependencies    {measured['dependencies_ms']:8.1f} ms")
+    print(f"import main     {measured['import_ms']:8.1f} ms")
+    print(f"create_app()    {measured['create_ms']:8.1f} ms")
+    print(f"app             {app_ms:8.1f} ms ({measured['ratio']:.3f} x dependencies)")
+
+    print(f"\n{'module':<48}{'cumulative ms':>14}")
+    slowest = sorted(
+        measured["last"]["importtime"].items(),
+        key=lambda item: item[1][1],
+        reverse=True,
+    )
+    for name, (_, cumulative_us) in slowest[: args.top]:
+        print(f"{name:<48}{cumulative_us / 1000:>14.1f}")
+
+    if args.update_baseline:
+        save_baseline(measured)
+        print(f"\nStored {measured['ratio']:.3f} as the baseline")
+        return 0
+
+    failed = False
+    allowed = load_baseline() * (1 + args.tolerance)
+    if measured["ratio"] > allowed:
+        print(
+            f"\nFAIL: startup is {measured['ratio']:.3f} x dependencies, "
+            f"over {allowed:.3f} (baseline + {args.tolerance:.0%})"
+        )
+        failed = True
+    loaded = set(measured["last"]["modules"])
+    for module in DEFERRED_MODULES:
+        if module in loaded:
+            print(f"\nFAIL: {module} is imported during startup")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,40 @@
+import base64
+import json
 from datetime import datetime, timezone
+from typing import Optional
 from flask import request, jsonify, g
-from db.models import Customer
-from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select, tuple_
+from db.models import Customer, Order, OrderItem, OrderStatus, order_item_line_total
+from db.query_budget import query_budget
+from db.projection import rows_to_json, select_rows, update_returning
+from pydantic import Field, ValidationError
 
 from flask import Blueprint
+from utils.invalidation import notify_invalidation
+from utils.request_body import (
+    PatchRequest,
+    decode_batch_ids,
+    decode_body,
+    decode_patch,
+)
+from utils.tracing import TracedModel
 
 customer = Blueprint("customer", __name__)
 
 
-class CustomerRequest(BaseModel):
+class CustomerRequest(TracedModel):
     name: str
     phone_number: str
     email: str = None
 
 
-class CustomerSchema(BaseModel):
+class CustomerPatch(PatchRequest):
+    name: str = None
+    phone_number: str = None
+    email: Optional[str] = None
+
+
+class CustomerSchema(TracedModel):
     id: int
     name: str
     phone_number: str
@@ -25,12 +45,82 @@ class CustomerSchema(BaseModel):
     updated_by: str
 
 
-class CustomerResponse(BaseModel):
+class CustomerResponse(TracedModel):
     data: list[CustomerSchema]
     count: int
 
 
+class CustomerBatchResponse(TracedModel):
+    data: dict[int, Optional[CustomerSchema]]
+    count: int
+    missing: list[int]
+
+
+class OrderHistoryQuery(TracedModel):
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None
+    include_totals: bool = False
+
+
+class OrderHistorySchema(TracedModel):
+    id: int
+    order_date: datetime
+    status: OrderStatus
+    item_count: Optional[int] = None
+    total: Optional[float] = None
+
+
+class OrderHistoryResponse(TracedModel):
+    data: list[OrderHistorySchema]
+    count: int
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(order_date, order_id):
+    """Encode the keyset position of the last order on a page."""
+    position = json.dumps([order_date.isoformat(), order_id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    :return: The order date and id to continue after
+    :rtype: tuple
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        order_date, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(order_date), int(order_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def order_totals_columns():
+    """
+    Per-order item count and total as correlated scalar subqueries.
+
+    They are evaluated only for the orders on the page, through the
+    order_items.order_id index.
+    """
+    item_count = (
+        select(func.coalesce(func.sum(OrderItem.quantity), 0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+        .label("item_count")
+    )
+    total = (
+        select(func.coalesce(func.sum(order_item_line_total()), 0.0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+        .label("total")
+    )
+    return [item_count, total]
+
+
 @customer.route("/", methods=["GET"])
+@query_budget(statement_timeout_ms=2000)
 def get_customers():
     """
     Return a list of all customers in the database.
@@ -40,13 +130,11 @@ def get_customers():
     :rtype: dict
     :statuscode 200: Customers found
     :statuscode 404: Customers not found
+    :statuscode 504: Listing took longer than the statement timeout
     """
-    customers = g.session.query(Customer).all()
+    keys, customers = select_rows(g.session, Customer, CustomerSchema)
     if customers:
-        customers_list = [customer.__dict__ for customer in customers]
-        return CustomerResponse(
-            data=customers_list, count=len(customers_list)
-        ).model_dump_json()
+        return rows_to_json(keys, customers)
     return jsonify({"data": [], "error": "Customers not found"}), 404
 
 
@@ -71,6 +159,87 @@ def get_customer(id):
     return jsonify({"data": [], "error": "Customer not found"}), 404
 
 
+@customer.route("/batch", methods=["POST"])
+def get_customers_batch():
+    """
+    Return many customers by id with one query.
+
+    The body is `{"ids": [...]}`. Results are keyed by id in request order,
+    with `null` for the ids that do not exist, which are also listed in
+    `missing`.
+
+    :return: The customers keyed by id
+    :rtype: dict
+    :statuscode 200: Batch fetched, possibly with missing customers
+    :statuscode 400: Bad request due to validation errors or too many ids
+    :statuscode 413: Request body too large
+    """
+    ids = decode_batch_ids()
+    keys, rows = select_rows(g.session, Customer, CustomerSchema, Customer.id.in_(ids))
+    found = {row.id: dict(zip(keys, row)) for row in rows}
+    return CustomerBatchResponse(
+        data={customer_id: found.get(customer_id) for customer_id in ids},
+        count=len(found),
+        missing=[customer_id for customer_id in ids if customer_id not in found],
+    ).model_dump_json()
+
+
+@customer.route("/<int:id>/orders", methods=["GET"])
+@query_budget(statement_timeout_ms=1000, max_queries=5)
+def get_customer_orders(id):
+    """
+    Return a page of a customer's orders, newest first.
+
+    Pages are keyset paginated on (order_date DESC, id DESC) and served from
+    the (customer_id, order_date, id) index, so every page costs the same no
+    matter how deep into the history it is.
+
+    :param id: The id of the customer
+    :query limit: Orders per page, 1 to 100 (default 20)
+    :query cursor: The `next_cursor` of the previous page
+    :query include_totals: Include each order's item count and total
+    :return: A page of orders and the cursor of the next page
+    :rtype: dict
+    :statuscode 200: Orders found
+    :statuscode 400: Bad request due to invalid query parameters
+    :statuscode 404: Customer not found
+    :statuscode 504: A page took longer than the statement timeout
+    """
+    try:
+        query = OrderHistoryQuery(**request.args.to_dict())
+        cursor = decode_cursor(query.cursor) if query.cursor else None
+    except ValidationError as e:
+        return jsonify({"data": [], "error": e.errors()}), 400
+    except ValueError as e:
+        return jsonify({"data": [], "error": str(e)}), 400
+
+    columns = [Order.id, Order.order_date, Order.status]
+    if query.include_totals:
+        columns += order_totals_columns()
+    statement = (
+        select(*columns)
+        .where(Order.customer_id == id)
+        .order_by(Order.order_date.desc(), Order.id.desc())
+        .limit(query.limit + 1)
+    )
+    if cursor:
+        statement = statement.where(tuple_(Order.order_date, Order.id) < cursor)
+    rows = g.session.execute(statement).all()
+
+    if not rows and not cursor and g.session.get(Customer, id) is None:
+        return jsonify({"data": [], "error": "Customer not found"}), 404
+
+    page = rows[: query.limit]
+    next_cursor = None
+    if len(rows) > query.limit:
+        next_cursor = encode_cursor(page[-1].order_date, page[-1].id)
+    return OrderHistoryResponse(
+        data=[row._mapping for row in page],
+        count=len(page),
+        next_cursor=next_cursor,
+    ).model_dump_json(exclude_unset=True)
+
+
 @customer.route("/", methods=["POST"])
 def add_customer():
     """
@@ -81,21 +250,21 @@ def add_customer():
     :rtype: dict
     :statuscode 201: Customer created
     :statuscode 400: Bad request
+    :statuscode 413: Request body too large
     """
-    try:
-        data = CustomerRequest(**request.get_json())
-        customer = Customer(**data.model_dump())
-        g.session.add(customer)
-        g.session.commit()
-        customer_list = [customer.__dict__]
-        return (
-            CustomerResponse(
-                data=customer_list, count=len(customer_list)
-            ).model_dump_json(),
-            201,
-        )
-    except ValidationError as e:
-        return jsonify({"data": [], "error": e.errors()}), 400
+    data = decode_body(CustomerRequest)
+    customer = Customer(**data.model_dump())
+    g.session.add(customer)
+    g.session.flush()
+    notify_invalidation(g.session, "customers", customer.id)
+    g.session.commit()
+    customer_list = [customer.__dict__]
+    return (
+        CustomerResponse(
+            data=customer_list, count=len(customer_list)
+        ).model_dump_json(),
+        201,
+    )
 
 
 @customer.route("/<int:id>", methods=["PUT"])
@@ -109,25 +278,51 @@ def update_customer(id):
     :statuscode 200: Customer updated
     :statuscode 400: Bad request due to validation errors
     :statuscode 404: Customer not found
+    :statuscode 413: Request body too large
     """
     customer = g.session.query(Customer).get(id)
     if customer:
-        try:
-            data = CustomerRequest(**request.get_json())
-            customer.name = data.name
-            customer.phone_number = data.phone_number
-            customer.email = data.email
-            customer.updated_at = datetime.now(timezone.utc)
-            g.session.commit()
-            customer_list = [customer.__dict__]
-            return CustomerResponse(
-                data=customer_list, count=len(customer_list)
-            ).model_dump_json()
-        except ValidationError as e:
-            return jsonify({"data": [], "error": e.errors()}), 400
+        data = decode_body(CustomerRequest)
+        customer.name = data.name
+        customer.phone_number = data.phone_number
+        customer.email = data.email
+        customer.updated_at = datetime.now(timezone.utc)
+        notify_invalidation(g.session, "customers", customer.id)
+        g.session.commit()
+        customer_list = [customer.__dict__]
+        return CustomerResponse(
+            data=customer_list, count=len(customer_list)
+        ).model_dump_json()
     return jsonify({"data": [], "error": "Customer not found for update"}), 404
 
 
+@customer.route("/<int:id>", methods=["PATCH"])
+def patch_customer(id):
+    """
+    Update only the fields sent for a customer.
+
+    The update and the read back of the row are a single statement.
+
+    :param id: The id of the customer to update
+    :return: The updated customer dictionary or an error message
+    :rtype: dict
+    :statuscode 200: Customer updated
+    :statuscode 400: Bad request due to validation errors, unknown fields or
+        no fields
+    :statuscode 404: Customer not found
+    :statuscode 413: Request body too large
+    """
+    values = decode_patch(CustomerPatch)
+    keys, customers = update_returning(
+        g.session, Customer, CustomerSchema, values, Customer.id == id
+    )
+    if not customers:
+        return jsonify({"data": [], "error": "Customer not found for update"}), 404
+    notify_invalidation(g.session, "customers", id)
+    g.session.commit()
+    return rows_to_json(keys, customers)
+
+
 @customer.route("/<int:id>", methods=["DELETE"])
 def delete_customer(id):
     """
@@ -143,6 +338,7 @@ def delete_customer(id):
     customer = g.session.query(Customer).get(id)
     if customer:
         g.session.delete(customer)
+        notify_invalidation(g.session, "customers", customer.id)
         g.session.commit()
         return jsonify({"data": [], "message": "Customer deleted"})
     return jsonify({"data": [], "error": "Customer not found for delete"}), 404
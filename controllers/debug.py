@@ -0,0 +1,81 @@
+from flask import current_app, jsonify, request
+
+from flask import Blueprint
+
+debug = Blueprint("debug", __name__)
+
+
+@debug.route("/traces", methods=["GET"])
+def get_slow_traces():
+    """
+    List the slow request traces kept in the ring buffer, newest first.
+
+    :return: A summary with the per-span-type time breakdown of each trace
+    :rtype: dict
+    :statuscode 200: Traces returned
+    """
+    traces = [trace.summary() for trace in current_app.extensions["traces"].list()]
+    return jsonify({"data": traces, "count": len(traces)})
+
+
+@debug.route("/traces/<string:trace_id>", methods=["GET"])
+def get_slow_trace(trace_id):
+    """
+    Return one slow trace with all of its spans as OTLP JSON.
+
+    :param trace_id: The id of the trace to return
+    :return: The trace in OTLP JSON format or an error message
+    :rtype: dict
+    :statuscode 200: Trace found
+    :statuscode 404: Trace not found
+    """
+    trace = current_app.extensions["traces"].find(trace_id)
+    if trace:
+        return jsonify(trace.to_otlp())
+    return jsonify({"data": [], "error": "Trace not found"}), 404
+
+
+@debug.route("/slow_queries", methods=["GET"])
+def get_slow_queries():
+    """
+    List the recorded slow queries with their plans, newest first.
+
+    :return: The slow queries
+    :rtype: dict
+    :statuscode 200: Slow queries returned
+    """
+    slow_queries = current_app.extensions["slow_query_log"].recent()
+    return jsonify({"data": slow_queries, "count": len(slow_queries)})
+
+
+@debug.route("/top_statements", methods=["GET"])
+def get_top_statements():
+    """
+    Report the statements with the highest total execution time.
+
+    :query limit: Number of statements to return, defaults to 20
+    :query order_by: One of total_ms, mean_ms, max_ms or calls
+    :return: The aggregated statement timings
+    :rtype: dict
+    :statuscode 200: Report returned
+    :statuscode 400: Unknown order_by
+    """
+    order_by = request.args.get("order_by", "total_ms")
+    if order_by not in ("total_ms", "mean_ms", "max_ms", "calls"):
+        return jsonify({"data": [], "error": f"Unknown order_by: {order_by}"}), 400
+    statements = current_app.extensions["slow_query_log"].top_statements(
+        limit=request.args.get("limit", 20, type=int), order_by=order_by
+    )
+    return jsonify({"data": statements, "count": len(statements)})
+
+
+@debug.route("/tasks", methods=["GET"])
+def get_task_stats():
+    """
+    Report the post-commit task queue depth and per-task timings.
+
+    :return: The pending task count and the counters of each task
+    :rtype: dict
+    :statuscode 200: Stats returned
+    """
+    return jsonify({"data": current_app.extensions["tasks"].stats()})
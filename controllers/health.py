@@ -0,0 +1,56 @@
+from flask import current_app, jsonify
+
+from flask import Blueprint
+
+from db.shards import SHARD_BIND_PREFIX
+from utils.health import pool_usage
+
+health = Blueprint("health", __name__)
+
+
+@health.route("/live", methods=["GET"])
+def liveness():
+    """
+    Report that the process is up and serving requests. Never touches the database.
+
+    :return: The liveness status
+    :rtype: dict
+    :statuscode 200: The process is alive
+    """
+    return jsonify({"data": {"status": "alive"}})
+
+
+@health.route("/ready", methods=["GET"])
+def readiness():
+    """
+    Report whether every database is reachable, migrated and has pool headroom.
+
+    Reachability and the migration head come from a cached probe on its own
+    connection, so frequent checks cost a dict lookup and never take a
+    connection from the request pool.
+
+    :return: The status of the default database and of each outlet
+    :rtype: dict
+    :statuscode 200: Ready to serve traffic
+    :statuscode 503: A database is unreachable, behind the migration head or
+        its pool is saturated
+    """
+    engines = current_app.extensions["sqlalchemy"].engines
+    ready = True
+    databases = {}
+    for outlet, probe in current_app.extensions["health"].items():
+        status = probe.result()
+        bind_key = None if outlet is None else f"{SHARD_BIND_PREFIX}{outlet}"
+        status["pool"] = pool_usage(engines[bind_key])
+        ready = ready and status["reachable"]
+        if current_app.config["HEALTH_REQUIRE_MIGRATION_HEAD"]:
+            ready = ready and status["at_head"]
+        if status["pool"] is not None:
+            ready = ready and (
+                status["pool"]["saturation"]
+                < current_app.config["HEALTH_POOL_SATURATION_LIMIT"]
+            )
+        databases[outlet or "default"] = status
+
+    data = {"status": "ready" if ready else "not_ready", "databases": databases}
+    return jsonify({"data": data}), 200 if ready else 503
@@ -1,22 +1,52 @@
+from typing import Optional
 from datetime import datetime, timezone
-from flask import request, jsonify, g
+from flask import jsonify, g
 from sqlalchemy import func
 from db.models import MenuItem
-from pydantic import BaseModel, ValidationError
-from pydantic import BaseModel
+from db.projection import rows_to_json, select_rows, update_returning
+from db.query_budget import query_budget
 from flask import Blueprint
+from utils.invalidation import notify_invalidation
+from utils.request_body import (
+    PatchRequest,
+    RequestBodyError,
+    decode_batch_ids,
+    decode_body,
+    decode_patch,
+)
+from utils.snapshot import get_snapshot, snapshot_response
+from utils.tracing import TracedModel
 
 menu_item = Blueprint("menu_item", __name__)
 
 
-class MenuItemRequest(BaseModel):
+class MenuItemRequest(TracedModel):
     active: bool
     name: str
     description: str = None
     price: float
 
 
-class MenuItemSchema(BaseModel):
+class MenuItemPatch(PatchRequest):
+    active: bool = None
+    name: str = None
+    description: str = None
+    price: float = None
+
+
+class MenuItemFilter(PatchRequest):
+    ids: list[int] = None
+    active: bool = None
+    min_price: float = None
+    max_price: float = None
+
+
+class MenuItemBulkPatch(PatchRequest):
+    where: MenuItemFilter
+    values: MenuItemPatch
+
+
+class MenuItemSchema(TracedModel):
     id: int
     name: str
     description: str
@@ -28,29 +58,86 @@ class MenuItemSchema(BaseModel):
     updated_by: str
 
 
-class MenuItemResponse(BaseModel):
+class MenuItemResponse(TracedModel):
     data: list[MenuItemSchema]
     count: int
 
 
+class MenuItemBatchResponse(TracedModel):
+    data: dict[int, Optional[MenuItemSchema]]
+    count: int
+    missing: list[int]
+
+
+def build_menu_payload(session):
+    """
+    Build the active menu response body.
+
+    :return: The status code and the response body
+    :rtype: tuple
+    """
+    keys, menu_items = select_rows(session, MenuItem, MenuItemSchema, MenuItem.active)
+    if menu_items:
+        return 200, rows_to_json(keys, menu_items)
+    return 404, jsonify({"data": [], "error": "Menu items not found"}).get_data()
+
+
+def refresh_menu_snapshot(session):
+    """Republish the shared menu snapshot after a menu write has committed."""
+    snapshot = get_snapshot("menu")
+    if snapshot is not None:
+        snapshot.publish(*build_menu_payload(session))
+
+
 @menu_item.route("/", methods=["GET"])
+@query_budget(statement_timeout_ms=2000, max_queries=5)
 def get_menu_items():
     """
     Retrieve all menu items from the database.
 
+    The response is served from the shared menu snapshot when it is enabled,
+    with an ETag and a gzip variant, so most requests do not touch the database.
+
     :return: A list of all menu items or an error message
     :rtype: dict
     :statuscode 200: Returns a list of menu items
+    :statuscode 304: The client's copy matches the ETag
     :statuscode 404: Menu items not found
+    :statuscode 504: Building the menu took longer than the statement timeout
     """
 
-    menu_items = g.session.query(MenuItem).filter(MenuItem.active).all()
-    if menu_items:
-        menu_items_list = [menu_item.__dict__ for menu_item in menu_items]
-        return MenuItemResponse(
-            data=menu_items_list, count=len(menu_items_list)
-        ).model_dump_json()
-    return jsonify({"data": [], "error": "Menu items not found"}), 404
+    snapshot = get_snapshot("menu")
+    if snapshot is not None:
+        return snapshot_response(
+            snapshot.get_or_build(lambda: build_menu_payload(g.session))
+        )
+    status, body = build_menu_payload(g.session)
+    return body, status
+
+
+@menu_item.route("/batch", methods=["POST"])
+def get_menu_items_batch():
+    """
+    Retrieve many menu items by id with one query, inactive ones included.
+
+    The body is `{"ids": [...]}`. Results are keyed by id in request order,
+    with `null` for the ids that do not exist, which are also listed in
+    `missing`.
+
+    :return: The menu items keyed by id
+    :rtype: dict
+    :statuscode 200: Batch fetched, possibly with missing menu items
+    :statuscode 400: Bad request due to validation errors or too many ids
+    :statuscode 413: Request body too large
+    """
+    ids = decode_batch_ids()
+    keys, rows = select_rows(g.session, MenuItem, MenuItemSchema, MenuItem.id.in_(ids))
+    found = {row.id: dict(zip(keys, row)) for row in rows}
+    return MenuItemBatchResponse(
+        data={menu_item_id: found.get(menu_item_id) for menu_item_id in ids},
+        count=len(found),
+        missing=[menu_item_id for menu_item_id in ids if menu_item_id not in found],
+    ).model_dump_json()
 
 
 @menu_item.route("/<string:item_name>", methods=["GET"])
@@ -88,22 +175,23 @@ def add_menu_item():
     :rtype: dict
     :statuscode 201: Menu item created successfully
     :statuscode 400: Bad request due to validation errors
+    :statuscode 413: Request body too large
     """
 
-    try:
-        data = MenuItemRequest(**request.get_json())
-        menu_item_detail = MenuItem(**data.model_dump())
-        g.session.add(menu_item_detail)
-        g.session.commit()
-        menu_item_detail_list = [menu_item_detail.__dict__]
-        return (
-            MenuItemResponse(
-                data=menu_item_detail_list, count=len(menu_item_detail_list)
-            ).model_dump_json(),
-            201,
-        )
-    except ValidationError as e:
-        return jsonify({"data": [], "error": e.errors()}), 400
+    data = decode_body(MenuItemRequest)
+    menu_item_detail = MenuItem(**data.model_dump())
+    g.session.add(menu_item_detail)
+    g.session.flush()
+    notify_invalidation(g.session, "menu_items", menu_item_detail.id)
+    g.session.commit()
+    refresh_menu_snapshot(g.session)
+    menu_item_detail_list = [menu_item_detail.__dict__]
+    return (
+        MenuItemResponse(
+            data=menu_item_detail_list, count=len(menu_item_detail_list)
+        ).model_dump_json(),
+        201,
+    )
 
 
 @menu_item.route("/<string:item_name>", methods=["PUT"])
@@ -117,6 +205,7 @@ def update_menu_item(item_name):
     :statuscode 200: Menu item updated successfully
     :statuscode 400: Bad request due to validation errors
     :statuscode 404: Menu item detail not found for update
+    :statuscode 413: Request body too large
     """
     menu_item_detail = (
         g.session.query(MenuItem)
@@ -124,18 +213,111 @@ def update_menu_item(item_name):
         .first()
     )
     if menu_item_detail:
-        try:
-            data = MenuItemRequest(**request.get_json())
-            menu_item_detail.name = data.name
-            menu_item_detail.description = data.description
-            menu_item_detail.price = data.price
-            menu_item_detail.active = data.active
-            menu_item_detail.updated_at = datetime.now(timezone.utc)
-            g.session.commit()
-            menu_item_detail_list = [menu_item_detail.__dict__]
-            return MenuItemResponse(
-                data=menu_item_detail_list, count=len(menu_item_detail_list)
-            ).model_dump_json()
-        except ValidationError as e:
-            return jsonify({"data": [], "error": e.errors()}), 400
+        data = decode_body(MenuItemRequest)
+        menu_item_detail.name = data.name
+        menu_item_detail.description = data.description
+        menu_item_detail.price = data.price
+        menu_item_detail.active = data.active
+        menu_item_detail.updated_at = datetime.now(timezone.utc)
+        notify_invalidation(g.session, "menu_items", menu_item_detail.id)
+        g.session.commit()
+        refresh_menu_snapshot(g.session)
+        menu_item_detail_list = [menu_item_detail.__dict__]
+        return MenuItemResponse(
+            data=menu_item_detail_list, count=len(menu_item_detail_list)
+        ).model_dump_json()
     return jsonify({"data": [], "error": "Menu item detail not found for update"}), 404
+
+
+@menu_item.route("/<string:item_name>", methods=["PATCH"])
+def patch_menu_item(item_name):
+    """
+    Update only the fields sent for a menu item.
+
+    The update and the read back of the row are a single statement.
+
+    :param item_name: The name of the menu item to update
+    :return: The updated menu item dictionary or an error message
+    :rtype: dict
+    :statuscode 200: Menu item updated successfully
+    :statuscode 400: Bad request due to validation errors, unknown fields or
+        no fields
+    :statuscode 404: Menu item detail not found for update
+    :statuscode 409: Several menu items match the name, nothing is updated
+    :statuscode 413: Request body too large
+    """
+    values = decode_patch(MenuItemPatch)
+    keys, menu_items = update_returning(
+        g.session,
+        MenuItem,
+        MenuItemSchema,
+        values,
+        func.lower(MenuItem.name) == func.lower(item_name),
+    )
+    if not menu_items:
+        return (
+            jsonify({"data": [], "error": "Menu item detail not found for update"}),
+            404,
+        )
+    # Names are matched case-insensitively and are not unique
+    if len(menu_items) > 1:
+        g.session.rollback()
+        return (
+            jsonify(
+                {
+                    "data": [],
+                    "error": "Several menu items match the name, update them by id",
+                }
+            ),
+            409,
+        )
+    notify_invalidation(g.session, "menu_items", *(row.id for row in menu_items))
+    g.session.commit()
+    refresh_menu_snapshot(g.session)
+    return rows_to_json(keys, menu_items)
+
+
+@menu_item.route("/", methods=["PATCH"])
+def bulk_patch_menu_items():
+    """
+    Update every menu item matching a filter with one statement.
+
+    The body is `{"where": {...}, "values": {...}}`. `where` accepts `ids`,
+    `active`, `min_price` and `max_price`, combined with AND, and must set at
+    least one of them. `values` takes the fields of a single item PATCH, e.g.
+    `{"where": {"ids": [3, 4]}, "values": {"active": false}}`.
+
+    :return: The updated menu items
+    :rtype: dict
+    :statuscode 200: Matching menu items updated, possibly none
+    :statuscode 400: Bad request due to validation errors, unknown fields, an
+        empty filter or no fields
+    :statuscode 413: Request body too large
+    """
+    data = decode_body(MenuItemBulkPatch)
+    where = data.where.model_dump(exclude_unset=True)
+    values = data.values.model_dump(exclude_unset=True)
+    if not where:
+        raise RequestBodyError(400, "At least one filter is required")
+    if not values:
+        raise RequestBodyError(400, "No fields to update")
+    criteria = []
+    if "ids" in where:
+        criteria.append(MenuItem.id.in_(where["ids"]))
+    if "active" in where:
+        criteria.append(MenuItem.active == where["active"])
+    if "min_price" in where:
+        criteria.append(MenuItem.price >= where["min_price"])
+    if "max_price" in where:
+        criteria.append(MenuItem.price <= where["max_price"])
+
+    keys, menu_items = update_returning(
+        g.session, MenuItem, MenuItemSchema, values, *criteria
+    )
+    if menu_items:
+        # Any menu notification rebuilds the whole snapshot, so one is enough
+        notify_invalidation(g.session, "menu_items", "*")
+    g.session.commit()
+    if menu_items:
+        refresh_menu_snapshot(g.session)
+    return rows_to_json(keys, menu_items)
@@ -1,19 +1,48 @@
 from flask import request, jsonify, g
-from db.models import Order
-from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, update
+from sqlalchemy.orm import joinedload, selectinload
+from db.models import ORDER_STATUS_TRANSITIONS, Order, OrderItem, OrderStatus
+from db.outbox import emit_event, emit_events
+from db.partitions import hot_window_start
+from db.query_budget import query_budget
+from pydantic import Field
 from flask import Blueprint
-from datetime import datetime, timezone
+from utils.request_body import decode_batch_ids, decode_body, max_body_size
+from utils.tracing import TracedModel
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from controllers.customer import CustomerSchema
+from controllers.menu_item import MenuItemSchema
+from controllers.order_item import OrderItemSchema
+from controllers.payment import PaymentSchema
 
 order = Blueprint("order", __name__)
 
 
-class OrderRequest(BaseModel):
+class OrderRequest(TracedModel):
     customer_id: int
-    order_date: datetime = datetime.now(timezone.utc)
+    order_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: str = "PENDING"
 
 
-class OrderSchema(BaseModel):
+class OrderStatusRequest(TracedModel):
+    status: OrderStatus
+    expected_status: Optional[OrderStatus] = None
+
+
+class BulkOrderStatusRequest(TracedModel):
+    from_status: OrderStatus
+    status: OrderStatus
+    older_than_minutes: Optional[int] = Field(default=None, ge=0)
+    order_ids: Optional[list[int]] = None
+    hot_window_only: bool = False
+
+
+class ExpandedOrderItemSchema(OrderItemSchema):
+    menu_item: Optional[MenuItemSchema] = None
+
+
+class OrderSchema(TracedModel):
     id: int
     customer_id: int
     order_date: datetime
@@ -22,34 +51,160 @@ class OrderSchema(BaseModel):
     updated_at: datetime
     created_by: str
     updated_by: str
+    items: Optional[list[ExpandedOrderItemSchema]] = None
+    customer: Optional[CustomerSchema] = None
+    payments: Optional[list[PaymentSchema]] = None
 
 
-class OrderResponse(BaseModel):
+class OrderResponse(TracedModel):
     data: list[OrderSchema]
     count: int
 
 
+class OrderBatchResponse(TracedModel):
+    data: dict[int, Optional[OrderSchema]]
+    count: int
+    missing: list[int]
+
+
+# Loader options for each supported `expand` value. Collections use
+# selectinload (one extra IN query) and scalars use joinedload (same query),
+# so the number of statements does not grow with the number of rows.
+EXPAND_OPTIONS = {
+    "items": lambda: selectinload(Order.order_items),
+    "items.menu_item": lambda: selectinload(Order.order_items).joinedload(
+        OrderItem.menu_item
+    ),
+    "customer": lambda: joinedload(Order.customer),
+    "payments": lambda: selectinload(Order.payment_transactions),
+}
+
+
+def parse_expand(value):
+    """
+    Parse a comma separated `expand` query parameter.
+
+    :param value: The raw value of the `expand` query parameter
+    :return: The set of requested expansions
+    :rtype: set
+    :raises ValueError: If an unknown expansion is requested
+    """
+    expand = {part.strip() for part in (value or "").split(",") if part.strip()}
+    unknown = expand - EXPAND_OPTIONS.keys()
+    if unknown:
+        raise ValueError(f"Unknown expand option(s): {', '.join(sorted(unknown))}")
+    if "items.menu_item" in expand:
+        expand.discard("items")
+    return expand
+
+
+def expand_loader_options(expand):
+    """Return the SQLAlchemy loader options for a set of expansions."""
+    return [EXPAND_OPTIONS[name]() for name in sorted(expand)]
+
+
+def order_to_dict(order_detail, expand):
+    """
+    Build the response dictionary for an order and its requested expansions.
+
+    Only relationships named in `expand` are touched, so nothing is
+    lazy-loaded that was not eagerly loaded by `expand_loader_options`.
+    """
+    order_dict = dict(order_detail.__dict__)
+    if "items" in expand or "items.menu_item" in expand:
+        order_dict["items"] = []
+        for order_item_detail in order_detail.order_items:
+            order_item_dict = dict(order_item_detail.__dict__)
+            if "items.menu_item" in expand:
+                order_item_dict["menu_item"] = order_item_detail.menu_item.__dict__
+            order_dict["items"].append(order_item_dict)
+    if "customer" in expand:
+        order_dict["customer"] = order_detail.customer.__dict__
+    if "payments" in expand:
+        order_dict["payments"] = [
+            payment_detail.__dict__
+            for payment_detail in order_detail.payment_transactions
+        ]
+    return order_dict
+
+
 @order.route("/<int:order_id>", methods=["GET"])
+@query_budget(statement_timeout_ms=1000, max_queries=10)
 def get_order_detail(order_id):
     """
     Retrieve the details of an order by its ID.
 
+    Related resources can be embedded with the `expand` query parameter, e.g.
+    `?expand=items.menu_item,customer,payments`.
+
     :param order_id: The ID of the order to retrieve
+    :query expand: Comma separated list of items, items.menu_item, customer, payments
     :return: A JSON representation of the order details if found; otherwise, an error message.
     :rtype: dict
     :statuscode 200: Order detail found
+    :statuscode 400: Unknown expand option
     :statuscode 404: Order detail not found
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: An expansion took longer than the statement timeout
     """
     g.logger.debug("Fetching details for order id: %s", order_id)
-    order_detail = g.session.query(Order).get(order_id)
+    try:
+        expand = parse_expand(request.args.get("expand"))
+    except ValueError as e:
+        return jsonify({"data": [], "error": str(e)}), 400
+    order_detail = (
+        g.session.query(Order)
+        .options(*expand_loader_options(expand))
+        .filter(Order.id == order_id)
+        .first()
+    )
     if order_detail:
-        order_detail_list = [order_detail.__dict__]
+        order_detail_list = [order_to_dict(order_detail, expand)]
         return OrderResponse(
             data=order_detail_list, count=len(order_detail_list)
-        ).model_dump_json()
+        ).model_dump_json(exclude_unset=True)
     return jsonify({"data": [], "error": "Order detail not found"}), 404
 
 
+@order.route("/batch", methods=["POST"])
+@query_budget(statement_timeout_ms=2000, max_queries=10)
+def get_order_details_batch():
+    """
+    Retrieve many orders by ID with one query.
+
+    The body is `{"ids": [...]}`. Results are keyed by ID in request order,
+    with `null` for the IDs that do not exist, which are also listed in
+    `missing`. `expand` works as for a single order, with one extra query per
+    expanded collection for the whole batch.
+
+    :query expand: Comma separated list of items, items.menu_item, customer, payments
+    :return: The orders keyed by ID
+    :rtype: dict
+    :statuscode 200: Batch fetched, possibly with missing orders
+    :statuscode 400: Bad request due to validation errors, too many ids or
+        an unknown expand option
+    :statuscode 413: Request body too large
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: The batch took longer than the statement timeout
+    """
+    ids = decode_batch_ids()
+    try:
+        expand = parse_expand(request.args.get("expand"))
+    except ValueError as e:
+        return jsonify({"data": [], "error": str(e)}), 400
+    found = {
+        order_detail.id: order_to_dict(order_detail, expand)
+        for order_detail in g.session.query(Order)
+        .options(*expand_loader_options(expand))
+        .filter(Order.id.in_(ids))
+    }
+    return OrderBatchResponse(
+        data={order_id: found.get(order_id) for order_id in ids},
+        count=len(found),
+        missing=[order_id for order_id in ids if order_id not in found],
+    ).model_dump_json(exclude_unset=True)
+
+
 @order.route("/", methods=["POST"])
 def add_order_detail():
     """
@@ -59,21 +214,27 @@ def add_order_detail():
     :rtype: dict
     :statuscode 201: Order created successfully
     :statuscode 400: Bad request due to validation errors
+    :statuscode 413: Request body too large
     """
-    try:
-        data = OrderRequest(**request.get_json())
-        order = Order(**data.model_dump())
-        g.session.add(order)
-        g.session.commit()
-        order_detail_list = [order.__dict__]
-        return (
-            OrderResponse(
-                data=order_detail_list, count=len(order_detail_list)
-            ).model_dump_json(),
-            201,
-        )
-    except ValidationError as e:
-        return jsonify({"data": [], "error": e.errors()}), 400
+    data = decode_body(OrderRequest)
+    order = Order(**data.model_dump())
+    g.session.add(order)
+    g.session.flush()
+    emit_event(
+        g.session,
+        "order.created",
+        "order",
+        order.id,
+        OrderSchema(**order.__dict__).model_dump(mode="json", exclude_unset=True),
+    )
+    g.session.commit()
+    order_detail_list = [order.__dict__]
+    return (
+        OrderResponse(
+            data=order_detail_list, count=len(order_detail_list)
+        ).model_dump_json(exclude_unset=True),
+        201,
+    )
 
 
 @order.route("/<int:order_id>", methods=["PUT"])
@@ -87,19 +248,194 @@ def update_order_detail(order_id):
     :statuscode 200: Order updated
     :statuscode 400: Bad request due to validation errors
     :statuscode 404: Order detail not found
+    :statuscode 409: Status change not allowed from the order's current status
+    :statuscode 413: Request body too large
     """
-    order = g.session.query(Order).get(order_id)
+    # Locked so the status checked below is still current when it is written
+    order = g.session.get(Order, order_id, with_for_update=True)
     if order:
+        data = decode_body(OrderRequest)
         try:
-            data = OrderRequest(**request.get_json())
-            order.customer_id = data.customer_id
-            order.status = data.status
-            order.updated_at = datetime.now(timezone.utc)
-            g.session.commit()
-            order_detail_list = [order.__dict__]
-            return OrderResponse(
-                data=order_detail_list, count=len(order_detail_list)
-            ).model_dump_json()
-        except ValidationError as e:
-            return jsonify({"data": [], "error": e.errors()}), 400
+            status = OrderStatus(data.status)
+        except ValueError as e:
+            return jsonify({"data": [], "error": str(e)}), 400
+        if status != order.status:
+            try:
+                allowed_source_statuses(status, order.status)
+            except ValueError as e:
+                return jsonify({"data": [], "error": str(e)}), 409
+        order.customer_id = data.customer_id
+        order.status = status
+        order.updated_at = datetime.now(timezone.utc)
+        emit_event(
+            g.session,
+            "order.updated",
+            "order",
+            order.id,
+            OrderSchema(**order.__dict__).model_dump(mode="json", exclude_unset=True),
+        )
+        g.session.commit()
+        order_detail_list = [order.__dict__]
+        return OrderResponse(
+            data=order_detail_list, count=len(order_detail_list)
+        ).model_dump_json(exclude_unset=True)
     return jsonify({"data": [], "error": "Order detail not found for update"}), 404
+
+
+def allowed_source_statuses(target_status, expected_status=None):
+    """
+    Return the statuses an order may be moved to `target_status` from.
+
+    :param target_status: The status the order should move to
+    :param expected_status: Optional status the caller expects the order to be in
+    :return: The set of legal source statuses
+    :rtype: set
+    :raises ValueError: If the transition is not allowed by the state machine
+    """
+    if expected_status is not None:
+        if target_status not in ORDER_STATUS_TRANSITIONS[expected_status]:
+            raise ValueError(
+                f"Illegal status transition {expected_status.value} -> {target_status.value}"
+            )
+        return {expected_status}
+    sources = {
+        source
+        for source, targets in ORDER_STATUS_TRANSITIONS.items()
+        if target_status in targets
+    }
+    if not sources:
+        raise ValueError(f"No order can be moved to {target_status.value}")
+    return sources
+
+
+def status_update_statement(target_status, *criteria):
+    """
+    Build a conditional `UPDATE orders ... RETURNING` for a status transition.
+
+    The source status check lives in the WHERE clause, so the transition is
+    applied atomically by the database and concurrent callers cannot both win.
+    """
+    return (
+        update(Order)
+        .where(*criteria)
+        .values(status=target_status, updated_at=func.now())
+        .returning(*Order.__table__.columns)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@order.route("/<int:order_id>/status", methods=["POST"])
+def transition_order_status(order_id):
+    """
+    Move an order to a new status in a single conditional UPDATE.
+
+    :param order_id: The ID of the order to transition
+    :return: The updated order details or an error message
+    :rtype: dict
+    :statuscode 200: Order status updated
+    :statuscode 400: Bad request due to validation errors
+    :statuscode 404: Order detail not found
+    :statuscode 413: Request body too large
+    :statuscode 409: Transition not allowed from the order's current status
+    """
+    data = decode_body(OrderStatusRequest)
+    try:
+        sources = allowed_source_statuses(data.status, data.expected_status)
+    except ValueError as e:
+        return jsonify({"data": [], "error": str(e)}), 409
+
+    updated = g.session.execute(
+        status_update_statement(
+            data.status, Order.id == order_id, Order.status.in_(sources)
+        )
+    ).first()
+    if updated:
+        emit_event(
+            g.session,
+            "order.status_changed",
+            "order",
+            order_id,
+            OrderSchema(**updated._mapping).model_dump(mode="json", exclude_unset=True),
+        )
+    g.session.commit()
+    if updated:
+        order_detail_list = [updated._mapping]
+        return OrderResponse(
+            data=order_detail_list, count=len(order_detail_list)
+        ).model_dump_json(exclude_unset=True)
+
+    # Only the failure path pays for a second round trip to explain itself
+    current_status = g.session.query(Order.status).filter(Order.id == order_id).scalar()
+    if current_status is None:
+        return (
+            jsonify({"data": [], "error": "Order detail not found for update"}),
+            404,
+        )
+    return (
+        jsonify(
+            {
+                "data": [],
+                "error": f"Illegal status transition {current_status.value} -> {data.status.value}",
+            }
+        ),
+        409,
+    )
+
+
+@order.route("/status", methods=["POST"])
+@max_body_size(1024 * 1024)
+def bulk_transition_order_status():
+    """
+    Move every matching order from one status to another in a single UPDATE.
+
+    For example `{"from_status": "READY", "status": "PICKED_UP",
+    "older_than_minutes": 30}` marks all orders that have been READY for more
+    than 30 minutes as picked up. `older_than_minutes` is measured against
+    `updated_at`, i.e. the time of the last transition. With
+    `"hot_window_only": true` only orders placed in the hot window are
+    considered, which lets Postgres skip every partition of `orders` but the
+    hot ones.
+
+    :return: The updated orders or an error message
+    :rtype: dict
+    :statuscode 200: Matching orders updated (possibly none)
+    :statuscode 400: Bad request due to validation errors
+    :statuscode 413: Request body too large
+    :statuscode 409: Transition not allowed by the state machine
+    """
+    data = decode_body(BulkOrderStatusRequest)
+    try:
+        allowed_source_statuses(data.status, data.from_status)
+    except ValueError as e:
+        return jsonify({"data": [], "error": str(e)}), 409
+
+    criteria = [Order.status == data.from_status]
+    if data.hot_window_only:
+        criteria.append(Order.order_date >= hot_window_start())
+    if data.older_than_minutes is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=data.older_than_minutes)
+        criteria.append(Order.updated_at <= cutoff)
+    if data.order_ids is not None:
+        criteria.append(Order.id.in_(data.order_ids))
+
+    updated = g.session.execute(status_update_statement(data.status, *criteria)).all()
+    emit_events(
+        g.session,
+        "order.status_changed",
+        "order",
+        [
+            OrderSchema(**row._mapping).model_dump(mode="json", exclude_unset=True)
+            for row in updated
+        ],
+    )
+    g.session.commit()
+    g.logger.info(
+        "Moved %s orders from %s to %s",
+        len(updated),
+        data.from_status.value,
+        data.status.value,
+    )
+    order_detail_list = [row._mapping for row in updated]
+    return OrderResponse(
+        data=order_detail_list, count=len(order_detail_list)
+    ).model_dump_json(exclude_unset=True)
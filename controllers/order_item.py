@@ -1,30 +1,44 @@
 from datetime import datetime, timezone
-from flask import request, jsonify, g
-from db.models import OrderItem
-from pydantic import BaseModel, ValidationError
+from typing import Optional
+from flask import jsonify, g
+from sqlalchemy import func, select
+from db.models import MenuItem, OrderItem
+from db.projection import rows_to_json, update_returning
+from pydantic import Field
 from flask import Blueprint
+from utils.invalidation import notify_invalidation
+from utils.request_body import PatchRequest, decode_body, decode_patch
+from utils.tracing import TracedModel
+from utils.cache import MISSING, get_cache, outlet_key
 
 order_item = Blueprint("order_item", __name__)
 
 
-class OrderItemRequest(BaseModel):
+class OrderItemRequest(TracedModel):
     order_id: int
     menu_item_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
+
+
+class OrderItemPatch(PatchRequest):
+    menu_item_id: int = None
+    quantity: int = Field(default=None, gt=0)
 
 
-class OrderItemSchema(BaseModel):
+class OrderItemSchema(TracedModel):
     id: int
     order_id: int
     menu_item_id: int
     quantity: int
+    unit_price: Optional[float] = None
+    line_total: Optional[float] = None
     created_at: datetime
     updated_at: datetime
     created_by: str
     updated_by: str
 
 
-class OrderItemResponse(BaseModel):
+class OrderItemResponse(TracedModel):
     data: list[OrderItemSchema]
     count: int
 
@@ -41,6 +55,11 @@ def get_order_items(order_id):
     :statuscode 404: Order items not found
     """
     g.logger.debug("Fetching order items for order id: %s", order_id)
+    cache = get_cache("order_items")
+    cached = cache.get(outlet_key(order_id))
+    if cached is not MISSING:
+        return cached
+    generation = cache.generation()
     order_items = (
         g.session.query(OrderItem).filter(OrderItem.order_id == order_id).all()
     )
@@ -48,9 +67,11 @@ def get_order_items(order_id):
         order_items_list = [
             order_item_detail.__dict__ for order_item_detail in order_items
         ]
-        return OrderItemResponse(
+        order_items_json = OrderItemResponse(
             data=order_items_list, count=len(order_items_list)
         ).model_dump_json()
+        cache.set(outlet_key(order_id), order_items_json, generation)
+        return order_items_json
     return jsonify({"data": [], "error": "Order item not found"}), 404
 
 
@@ -63,21 +84,21 @@ def add_order_item():
     :rtype: dict
     :statuscode 201: Order item created successfully
     :statuscode 400: Bad request due to validation errors
+    :statuscode 413: Request body too large
     """
-    try:
-        data = OrderItemRequest(**request.get_json())
-        order_item = OrderItem(**data.model_dump())
-        g.session.add(order_item)
-        g.session.commit()
-        order_item_list = [order_item.__dict__]
-        return (
-            OrderItemResponse(
-                data=order_item_list, count=len(order_item_list)
-            ).model_dump_json(),
-            201,
-        )
-    except ValidationError as e:
-        return jsonify({"data": [], "error": e.errors()}), 400
+    data = decode_body(OrderItemRequest)
+    order_item = OrderItem(**data.model_dump())
+    g.session.add(order_item)
+    notify_invalidation(g.session, "order_items", order_item.order_id)
+    g.session.commit()
+    get_cache("order_items").invalidate(outlet_key(order_item.order_id))
+    order_item_list = [order_item.__dict__]
+    return (
+        OrderItemResponse(
+            data=order_item_list, count=len(order_item_list)
+        ).model_dump_json(),
+        201,
+    )
 
 
 @order_item.route("/<int:order_id>", methods=["PUT"])
@@ -91,25 +112,106 @@ def update_order_item(order_id):
     :statuscode 200: Order item updated successfully.
     :statuscode 400: Bad request due to validation errors.
     :statuscode 404: Order item not found for update.
+    :statuscode 413: Request body too large.
     """
     order_item = g.session.query(OrderItem).get(order_id)
     if order_item:
-        try:
-            data = OrderItem(**request.get_json())
-            order_item.order_id = data.order_id
-            order_item.menu_item_id = data.menu_item_id
-            order_item.quantity = data.quantity
-            order_item.updated_at = datetime.now(timezone.utc)
-            g.session.commit()
-            order_item_list = [order_item.__dict__]
-            return OrderItemResponse(
-                data=order_item_list, count=len(order_item_list)
-            ).model_dump_json()
-        except ValidationError as e:
-            return jsonify({"data": [], "error": e.errors()}), 400
+        data = decode_body(OrderItemRequest)
+        previous_order_id = order_item.order_id
+        order_item.order_id = data.order_id
+        order_item.menu_item_id = data.menu_item_id
+        order_item.quantity = data.quantity
+        order_item.updated_at = datetime.now(timezone.utc)
+        notify_invalidation(
+            g.session, "order_items", previous_order_id, order_item.order_id
+        )
+        g.session.commit()
+        get_cache("order_items").invalidate(
+            outlet_key(previous_order_id), outlet_key(order_item.order_id)
+        )
+        order_item_list = [order_item.__dict__]
+        return OrderItemResponse(
+            data=order_item_list, count=len(order_item_list)
+        ).model_dump_json()
     return jsonify({"data": [], "error": "Order item not found for update"}), 404
 
 
+def priced_values(values):
+    """
+    Add the unit price and line total a PATCH implies, as SQL expressions.
+
+    Stands in for the ORM pricing listeners, which a bulk UPDATE skips. The
+    right hand sides of an UPDATE see the row before the update.
+    """
+    quantity = values.get("quantity", OrderItem.quantity)
+    if "menu_item_id" in values:
+        unit_price = (
+            select(MenuItem.price)
+            .where(MenuItem.id == values["menu_item_id"])
+            .scalar_subquery()
+        )
+        return {
+            **values,
+            "unit_price": unit_price,
+            "line_total": unit_price * quantity,
+        }
+    if "quantity" in values:
+        # Prices a row the backfill has not reached yet
+        unit_price = func.coalesce(
+            OrderItem.unit_price,
+            select(MenuItem.price)
+            .where(MenuItem.id == OrderItem.menu_item_id)
+            .scalar_subquery(),
+        )
+        return {
+            **values,
+            "unit_price": unit_price,
+            "line_total": unit_price * quantity,
+        }
+    return values
+
+
+@order_item.route("/<int:order_item_id>", methods=["PATCH"])
+def patch_order_item(order_item_id):
+    """
+    Change the menu item or quantity of an order item.
+
+    The line total is recomputed, and the item re-priced if it moves to
+    another menu item, in the same statement that reads the row back. Use
+    PUT to move an item to another order.
+
+    :param order_item_id: The ID of the order item to update.
+    :return: The updated order item if successful; otherwise, an error message.
+    :rtype: dict
+    :statuscode 200: Order item updated successfully.
+    :statuscode 400: Bad request due to validation errors, unknown fields or
+        no fields.
+    :statuscode 404: Order item not found for update, or the menu item it
+        should move to does not exist.
+    :statuscode 413: Request body too large.
+    """
+    values = decode_patch(OrderItemPatch)
+    if (
+        "menu_item_id" in values
+        and g.session.get(MenuItem, values["menu_item_id"]) is None
+    ):
+        return jsonify({"data": [], "error": "Menu item not found"}), 404
+    keys, order_items = update_returning(
+        g.session,
+        OrderItem,
+        OrderItemSchema,
+        priced_values(values),
+        OrderItem.id == order_item_id,
+    )
+    if not order_items:
+        return jsonify({"data": [], "error": "Order item not found for update"}), 404
+    order_id = order_items[0].order_id
+    notify_invalidation(g.session, "order_items", order_id)
+    g.session.commit()
+    get_cache("order_items").invalidate(outlet_key(order_id))
+    return rows_to_json(keys, order_items)
+
+
 @order_item.route("/<int:order_id>/<int:menu_item_id>", methods=["DELETE"])
 def delete_order_item(order_id, menu_item_id):
     """
@@ -130,6 +232,20 @@ def delete_order_item(order_id, menu_item_id):
     )
     if order_item:
         g.session.delete(order_item)
+        notify_invalidation(g.session, "order_items", order_id)
         g.session.commit()
+        get_cache("order_items").invalidate(outlet_key(order_id))
         return jsonify({"data": [], "message": "Order item deleted"})
     return jsonify({"data": [], "error": "Order item not found for delete"}), 404
+
+
+@order_item.route("/cache/stats", methods=["GET"])
+def get_order_item_cache_stats():
+    """
+    Return the size, hit rate and eviction counters of the order item cache.
+
+    :return: The cache statistics
+    :rtype: dict
+    :statuscode 200: Cache statistics returned
+    """
+    return jsonify({"data": get_cache("order_items").stats()})
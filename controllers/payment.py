@@ -1,22 +1,48 @@
 from datetime import datetime, timezone
-from flask import request, jsonify, g
-from db.models import PaymentTransaction
-from pydantic import BaseModel, ValidationError
+from enum import Enum
+from typing import Optional
+from flask import jsonify, g
+from sqlalchemy import case, func, select
+from db.models import (
+    Order,
+    OrderItem,
+    PaymentMethod,
+    PaymentTransaction,
+    order_item_line_total,
+)
+from db.projection import rows_to_json, update_returning
+from db.outbox import emit_event
+from pydantic import Field
+from pydantic_core import to_jsonable_python
 
 from flask import Blueprint
+from utils.request_body import (
+    PatchRequest,
+    decode_batch_ids,
+    decode_body,
+    decode_patch,
+)
+from utils.tracing import TracedModel
 
 payment = Blueprint("payment", __name__)
 
 
-class PaymentRequest(BaseModel):
+class PaymentRequest(TracedModel):
     order_id: int
-    payment_date: datetime = datetime.now(timezone.utc)
+    payment_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     amount: float
     payment_method: str = "OTHERS"
     paid: bool
 
 
-class PaymentSchema(BaseModel):
+class PaymentPatch(PatchRequest):
+    payment_date: datetime = None
+    amount: float = None
+    payment_method: PaymentMethod = None
+    paid: bool = None
+
+
+class PaymentSchema(TracedModel):
     id: int
     order_id: int
     payment_date: datetime
@@ -25,21 +51,99 @@ class PaymentSchema(BaseModel):
     paid: bool = False
 
 
-class PaymentResponse(BaseModel):
+class PaymentResponse(TracedModel):
     data: list[PaymentSchema]
     count: int
 
 
+class PaymentState(str, Enum):
+    UNPAID = "UNPAID"
+    PARTIALLY_PAID = "PARTIALLY_PAID"
+    PAID = "PAID"
+
+
+class PaymentSummarySchema(TracedModel):
+    order_id: int
+    order_total: float
+    paid_amount: float
+    pending_amount: float
+    outstanding_amount: float
+    transaction_count: int
+    state: PaymentState
+
+
+class OrderPaymentsSchema(PaymentSummarySchema):
+    transactions: list[PaymentSchema]
+
+
+class OrderPaymentsResponse(TracedModel):
+    data: list[OrderPaymentsSchema]
+    count: int
+
+
+class PaymentSummaryBatchResponse(TracedModel):
+    data: dict[int, Optional[PaymentSummarySchema]]
+    count: int
+    missing: list[int]
+
+
+def payment_totals_columns():
+    """
+    Return the order total and the paid and pending payment sums of an order.
+
+    Used with `orders LEFT JOIN payment_transactions`, aggregated per order or
+    as window functions. The sums are NULL for an order without payments.
+    """
+    order_total = (
+        select(func.coalesce(func.sum(order_item_line_total()), 0.0))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+        .label("order_total")
+    )
+    paid_amount = func.sum(case((PaymentTransaction.paid, PaymentTransaction.amount)))
+    pending_amount = func.sum(
+        case((~PaymentTransaction.paid, PaymentTransaction.amount))
+    )
+    return order_total, paid_amount, pending_amount
+
+
+def payment_summary(order_id, order_total, paid_amount, pending_amount, count):
+    """Derive the outstanding amount and payment state of an order."""
+    paid_amount = paid_amount or 0.0
+    pending_amount = pending_amount or 0.0
+    outstanding_amount = round(max(order_total - paid_amount, 0.0), 2)
+    if paid_amount <= 0:
+        state = PaymentState.UNPAID
+    elif outstanding_amount > 0:
+        state = PaymentState.PARTIALLY_PAID
+    else:
+        state = PaymentState.PAID
+    return {
+        "order_id": order_id,
+        "order_total": round(order_total, 2),
+        "paid_amount": round(paid_amount, 2),
+        "pending_amount": round(pending_amount, 2),
+        "outstanding_amount": outstanding_amount,
+        "transaction_count": count,
+        "state": state,
+    }
+
+
 @payment.route("/<int:order_id>", methods=["GET"])
 def get_payment_status(order_id):
     """
-    Retrieve the payment status for a given order ID.
+    Retrieve one payment transaction by its own ID.
+
+    Despite the parameter name this looks up the transaction's primary key.
+    Use `GET /payment/order/<order_id>` for the payments of an order.
 
-    :param order_id: The ID of the order to retrieve the payment status for.
+    :param order_id: The ID of the payment transaction.
     :return: A JSON representation of the payment status if found; otherwise, an error message.
     :rtype: dict
     :statuscode 200: Payment status found
     :statuscode 404: Payment transaction not found
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
     """
     payment_status = g.session.query(PaymentTransaction).get(order_id)
     if payment_status:
@@ -50,6 +154,112 @@ def get_payment_status(order_id):
     return jsonify({"data": [], "error": "Payment transaction not found"}), 404
 
 
+@payment.route("/order/<int:order_id>", methods=["GET"])
+def get_order_payments(order_id):
+    """
+    Retrieve every payment transaction of an order with its payment state.
+
+    Transactions and the paid, pending and outstanding amounts come from one
+    query: the sums are window aggregates over the order's transactions.
+    Outstanding is the order total (the sum of its line totals) minus the
+    paid amount.
+
+    :param order_id: The ID of the order
+    :return: The order's transactions and aggregated payment amounts
+    :rtype: dict
+    :statuscode 200: Order found, possibly without transactions
+    :statuscode 404: Order not found
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
+    """
+    order_total, paid_amount, pending_amount = payment_totals_columns()
+    transaction_columns = [
+        PaymentTransaction.id,
+        PaymentTransaction.payment_date,
+        PaymentTransaction.amount,
+        PaymentTransaction.payment_method,
+        PaymentTransaction.paid,
+    ]
+    rows = g.session.execute(
+        select(
+            order_total,
+            paid_amount.over().label("paid_amount"),
+            pending_amount.over().label("pending_amount"),
+            *transaction_columns,
+        )
+        .select_from(Order)
+        .outerjoin(PaymentTransaction, PaymentTransaction.order_id == Order.id)
+        .where(Order.id == order_id)
+        .order_by(PaymentTransaction.payment_date, PaymentTransaction.id)
+    ).all()
+    if not rows:
+        return jsonify({"data": [], "error": "Order not found"}), 404
+
+    # An order without payments comes back as one row of NULL transaction columns
+    transactions = [
+        {
+            "id": row.id,
+            "order_id": order_id,
+            "payment_date": row.payment_date,
+            "amount": row.amount,
+            "payment_method": row.payment_method.value,
+            "paid": row.paid,
+        }
+        for row in rows
+        if row.id is not None
+    ]
+    first = rows[0]
+    order_payments = payment_summary(
+        order_id,
+        first.order_total,
+        first.paid_amount,
+        first.pending_amount,
+        len(transactions),
+    )
+    order_payments["transactions"] = transactions
+    return OrderPaymentsResponse(data=[order_payments], count=1).model_dump_json()
+
+
+@payment.route("/order/status", methods=["POST"])
+def get_order_payment_states():
+    """
+    Retrieve the payment state of many orders with one query.
+
+    The body is `{"ids": [...]}` with order IDs. Summaries are keyed by
+    order ID in request order, with `null` for orders that do not exist,
+    which are also listed in `missing`.
+
+    :return: The payment summaries keyed by order ID
+    :rtype: dict
+    :statuscode 200: Batch fetched, possibly with missing orders
+    :statuscode 400: Bad request due to validation errors or too many ids
+    :statuscode 413: Request body too large
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
+    """
+    ids = decode_batch_ids()
+    order_total, paid_amount, pending_amount = payment_totals_columns()
+    rows = g.session.execute(
+        select(
+            Order.id,
+            order_total,
+            paid_amount,
+            pending_amount,
+            func.count(PaymentTransaction.id),
+        )
+        .select_from(Order)
+        .outerjoin(PaymentTransaction, PaymentTransaction.order_id == Order.id)
+        .where(Order.id.in_(ids))
+        .group_by(Order.id)
+    ).all()
+    found = {row[0]: payment_summary(*row) for row in rows}
+    return PaymentSummaryBatchResponse(
+        data={order_id: found.get(order_id) for order_id in ids},
+        count=len(found),
+        missing=[order_id for order_id in ids if order_id not in found],
+    ).model_dump_json()
+
+
 @payment.route("/", methods=["POST"])
 def add_payment_status():
     """
@@ -60,52 +270,113 @@ def add_payment_status():
     :rtype: dict
     :statuscode 201: Payment status created
     :statuscode 400: Bad request due to validation errors
+    :statuscode 413: Request body too large
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
     """
-    try:
-        data = PaymentRequest(**request.get_json())
-        payment_status = PaymentTransaction(**data.model_dump())
-        g.session.add(payment_status)
-        g.session.commit()
-        payment_status_list = [payment_status.__dict__]
-        return (
-            PaymentResponse(
-                data=payment_status_list, count=len(payment_status_list)
-            ).model_dump_json(),
-            201,
-        )
-    except ValidationError as e:
-        return jsonify({"data": [], "error": e.errors()}), 400
+    data = decode_body(PaymentRequest)
+    payment_status = PaymentTransaction(**data.model_dump())
+    g.session.add(payment_status)
+    g.session.flush()
+    emit_event(
+        g.session,
+        "payment.created",
+        "payment",
+        payment_status.id,
+        PaymentSchema(**payment_status.__dict__).model_dump(mode="json"),
+    )
+    g.session.commit()
+    payment_status_list = [payment_status.__dict__]
+    return (
+        PaymentResponse(
+            data=payment_status_list, count=len(payment_status_list)
+        ).model_dump_json(),
+        201,
+    )
 
 
 @payment.route("/<int:order_id>", methods=["PUT"])
 def update_payment_status(order_id):
     """
-    Update the payment status for a given order ID.
+    Update one payment transaction by its own ID.
+
+    Despite the parameter name this looks up the transaction's primary key.
+    A `payment.updated` event with the new row is committed with the change.
 
-    :param order_id: The ID of the order to update the payment status for.
+    :param order_id: The ID of the payment transaction.
     :return: The updated payment status if found; otherwise, an error message.
     :rtype: dict
     :statuscode 200: Payment status updated
     :statuscode 400: Bad request due to validation errors
     :statuscode 404: Payment transaction not found
+    :statuscode 413: Request body too large
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
     """
     payment_status = g.session.query(PaymentTransaction).get(order_id)
     if payment_status:
-        try:
-            data = PaymentRequest(**request.get_json())
-            payment_status.order_id = data.order_id
-            payment_status.amount = data.amount
-            payment_status.payment_method = data.payment_method
-            payment_status.paid = data.paid
-            payment_status.updated_at = datetime.now(timezone.utc)
-            g.session.commit()
-            payment_status_list = [payment_status.__dict__]
-            return PaymentResponse(
-                data=payment_status_list, count=len(payment_status_list)
-            ).model_dump_json()
-        except ValidationError as e:
-            return jsonify({"error": e.errors()}), 400
+        data = decode_body(PaymentRequest)
+        payment_status.order_id = data.order_id
+        payment_status.amount = data.amount
+        payment_status.payment_method = data.payment_method
+        payment_status.paid = data.paid
+        payment_status.updated_at = datetime.now(timezone.utc)
+        emit_event(
+            g.session,
+            "payment.updated",
+            "payment",
+            payment_status.id,
+            PaymentSchema(**payment_status.__dict__).model_dump(mode="json"),
+        )
+        g.session.commit()
+        payment_status_list = [payment_status.__dict__]
+        return PaymentResponse(
+            data=payment_status_list, count=len(payment_status_list)
+        ).model_dump_json()
     return (
         jsonify({"data": [], "error": "Payment transaction not found for update"}),
         404,
     )
+
+
+@payment.route("/<int:payment_id>", methods=["PATCH"])
+def patch_payment(payment_id):
+    """
+    Update only the fields sent for a payment transaction, e.g. `paid`.
+
+    The update and the read back of the row are a single statement. A
+    `payment.updated` event with the new row is committed with the change.
+
+    :param payment_id: The ID of the payment transaction.
+    :return: The updated payment transaction if found; otherwise, an error message.
+    :rtype: dict
+    :statuscode 200: Payment status updated
+    :statuscode 400: Bad request due to validation errors, unknown fields or
+        no fields
+    :statuscode 404: Payment transaction not found
+    :statuscode 413: Request body too large
+    :statuscode 503: Query budget exceeded
+    :statuscode 504: A query took longer than the statement timeout
+    """
+    values = decode_patch(PaymentPatch)
+    keys, payments = update_returning(
+        g.session,
+        PaymentTransaction,
+        PaymentSchema,
+        values,
+        PaymentTransaction.id == payment_id,
+    )
+    if not payments:
+        return (
+            jsonify({"data": [], "error": "Payment transaction not found for update"}),
+            404,
+        )
+    emit_event(
+        g.session,
+        "payment.updated",
+        "payment",
+        payment_id,
+        to_jsonable_python(dict(zip(keys, payments[0]))),
+    )
+    g.session.commit()
+    return rows_to_json(keys, payments)
@@ -1,7 +1,15 @@
 import os
-from flask import g
+from flask import g, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 
+from db.shards import ShardRouter, load_shard_map, shard_binds
+
+SESSION_OPTIONS = {
+    "autocommit": False,
+    "autoflush": False,
+    "expire_on_commit": False,
+}
+
 
 def configure_db_session(app):
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("SQLALCHEMY_DATABASE_URI", "")
@@ -12,20 +20,30 @@ def configure_db_session(app):
     app.config["SQLALCHEMY_MAX_OVERFLOW"] = os.getenv("SQLALCHEMY_MAX_OVERFLOW", "")
     app.config["SQLALCHEMY_POOL_TIMEOUT"] = os.getenv("SQLALCHEMY_POOL_TIMEOUT", "")
     app.config["SQLALCHEMY_POOL_RECYCLE"] = os.getenv("SQLALCHEMY_POOL_RECYCLE", "")
+    app.config["SHARD_MAP"] = load_shard_map()
+    app.config["SHARD_HEADER"] = os.getenv("SHARD_HEADER", "X-Outlet-Id")
+    app.config["SQLALCHEMY_BINDS"] = shard_binds(app.config["SHARD_MAP"])
 
-    db = SQLAlchemy(
-        app,
-        session_options={
-            "autocommit": False,
-            "autoflush": False,
-            "expire_on_commit": False,
-        },
-    )
+    db = SQLAlchemy(app, session_options=dict(SESSION_OPTIONS))
+
+    with app.app_context():
+        shards = ShardRouter(db, app.config["SHARD_MAP"], SESSION_OPTIONS)
+    app.extensions["shards"] = shards
 
     @app.teardown_appcontext
     def close_session(exception=None):
         db.session.remove()
+        shards.remove()
 
     @app.before_request
     def attach_session():
-        g.session = db.session
+        # Requests without an outlet use the default database
+        outlet = request.headers.get(app.config["SHARD_HEADER"])
+        if not outlet:
+            g.session = db.session
+            return None
+        if outlet not in app.config["SHARD_MAP"]:
+            return jsonify({"data": [], "error": f"Unknown outlet: {outlet}"}), 400
+        g.outlet = outlet
+        g.session = shards.session(outlet)
+        return None
@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from db.models import OutboxEvent
+from utils.tasks import on_commit
+
+
+def emit_event(session, event_type, aggregate_type, aggregate_id, payload):
+    """
+    Stage an outbox event in the caller's transaction.
+
+    The event is only visible to the dispatcher once the caller commits, and
+    is discarded with everything else on rollback. In-process hooks registered
+    with `utils.tasks.task_hook` run in the background after the commit.
+
+    :param session: The session the business change is being written with
+    :param event_type: The event name, e.g. "order.created"
+    :param aggregate_type: The kind of entity the event is about, e.g. "order"
+    :param aggregate_id: The id of that entity
+    :param payload: A JSON serializable dictionary describing the change
+    """
+    session.add(
+        OutboxEvent(
+            event_type=event_type,
+            aggregate_type=aggregate_type,
+            aggregate_id=aggregate_id,
+            payload=payload,
+        )
+    )
+    on_commit(session, event_type, payload)
+
+
+def emit_events(session, event_type, aggregate_type, payloads):
+    """
+    Stage one outbox event per payload with a single multi-row INSERT.
+
+    Every payload must carry the aggregate's id under the "id" key.
+    """
+    if not payloads:
+        return
+    session.execute(
+        insert(OutboxEvent),
+        [
+            {
+                "event_type": event_type,
+                "aggregate_type": aggregate_type,
+                "aggregate_id": payload["id"],
+                "payload": payload,
+                "attempts": 0,
+            }
+            for payload in payloads
+        ],
+    )
+    for payload in payloads:
+        on_commit(session, event_type, payload)
+
+
+def claim_events(session, batch_size, max_attempts):
+    """
+    Lock and return the next batch of undelivered events.
+
+    `FOR UPDATE SKIP LOCKED` lets several dispatchers run side by side without
+    blocking on, or double delivering, each other's batches. The locks are
+    held until the caller's transaction ends.
+    """
+    return (
+        session.query(OutboxEvent)
+        .filter(
+            OutboxEvent.dispatched_at.is_(None),
+            OutboxEvent.available_at <= datetime.now(timezone.utc),
+            OutboxEvent.attempts < max_attempts,
+        )
+        .order_by(OutboxEvent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def event_to_dict(event):
+    """Return the wire representation of an outbox event."""
+    return {
+        "id": event.id,
+        "event_type": event.event_type,
+        "aggregate_type": event.aggregate_type,
+        "aggregate_id": event.aggregate_id,
+        "payload": event.payload,
+        "created_at": event.created_at.isoformat() if event.created_at else None,
+    }
@@ -0,0 +1,307 @@
+import argparse
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# Tables that are range partitioned by month, and their partition key
+PARTITIONED_TABLES = {
+    "orders": "order_date",
+    "order_items": "created_at",
+    "payment_transactions": "payment_date",
+}
+
+ARCHIVE_SCHEMA = os.getenv("ARCHIVE_SCHEMA", "archive")
+
+# How far back "today's operations" reach. Adding this bound as a predicate on
+# the partition key lets Postgres prune every partition but the hot ones.
+HOT_WINDOW_HOURS = int(os.getenv("HOT_WINDOW_HOURS", "24"))
+
+# How long a detach may wait for its lock before it backs off and retries
+DETACH_LOCK_TIMEOUT = os.getenv("PARTITION_DETACH_LOCK_TIMEOUT", "1s")
+DETACH_RETRIES = int(os.getenv("PARTITION_DETACH_RETRIES", "10"))
+
+# lock_not_available
+LOCK_NOT_AVAILABLE_SQLSTATE = "55P03"
+
+PARTITION_NAME = re.compile(r"^(?P<table>\w+)_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def month_start(value):
+    """Return midnight UTC on the first day of the month containing `value`."""
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(value, months):
+    """Return the first day of the month `months` away from `value`."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table, start):
+    """Return the name of the monthly partition of `table` starting at `start`."""
+    return f"{table}_p{start:%Y_%m}"
+
+
+def hot_window_start(now=None):
+    """
+    Return the lower bound of the hot window.
+
+    :param now: Optional reference time, defaults to the current UTC time
+    :return: The oldest timestamp an operational query needs to look at
+    :rtype: datetime
+    """
+    now = now or datetime.now(timezone.utc)
+    return now - timedelta(hours=HOT_WINDOW_HOURS)
+
+
+def default_partition_name(table):
+    """Return the name of the default partition of `table`."""
+    return f"{table}_default"
+
+
+def is_partitioned(connection, table):
+    """Return whether `table` exists and is a partitioned table."""
+    return bool(
+        connection.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def create_partition(connection, table, start):
+    """
+    Create the monthly partition of `table` starting at `start` if missing.
+
+    Postgres refuses to create a partition for a range the default partition
+    already holds rows of, e.g. rows written before the partition existed.
+    The partition is therefore built as a plain table, those rows are moved
+    into it, and it is attached. Attaching locks `table` only against DDL,
+    while the default partition is locked until the caller's transaction
+    ends, so no row of the range can land there meanwhile.
+    """
+    name = partition_name(table, start)
+    exists = connection.execute(
+        text("SELECT to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if exists:
+        return
+    end = add_months(start, 1)
+    key = PARTITIONED_TABLES[table]
+    default = default_partition_name(table)
+
+    # In the order queries take them: the parent, then its partitions
+    connection.execute(text(f"LOCK TABLE {table} IN SHARE UPDATE EXCLUSIVE MODE"))
+    connection.execute(text(f"LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    moved = connection.execute(
+        text(
+            f"WITH moved AS ("
+            f"DELETE FROM {default} WHERE {key} >= :start AND {key} < :end "
+            f"RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    ).rowcount
+    connection.execute(
+        text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    if moved:
+        logger.info("Moved %s rows from %s into %s", moved, default, name)
+
+
+def ensure_partitions(connection, months_ahead=2, now=None, since=None):
+    """
+    Create the monthly partitions of every table up to `months_ahead` months.
+
+    Run this on a schedule (e.g. daily) so new rows never land in the
+    default partition.
+
+    :param since: The oldest month to create, defaults to the current month
+    """
+    now = now or datetime.now(timezone.utc)
+    month = month_start(since or now)
+    last = add_months(month_start(now), months_ahead)
+    while month <= last:
+        for table in PARTITIONED_TABLES:
+            create_partition(connection, table, month)
+        month = add_months(month, 1)
+
+
+def list_partitions(connection, table):
+    """
+    Return the monthly partitions attached to `table`, oldest first.
+
+    :return: A list of (partition name, month start) tuples
+    :rtype: list
+    """
+    names = connection.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    ).scalars()
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            start = datetime(
+                int(match["year"]), int(match["month"]), 1, tzinfo=timezone.utc
+            )
+            partitions.append((name, start))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def detach(engine, table, name, then):
+    """
+    Detach partition `name` from `table` and run `then` in the same transaction.
+
+    DETACH PARTITION ... CONCURRENTLY is refused while `table` has a default
+    partition, so the plain form is used. It only updates the catalog, but it
+    needs an ACCESS EXCLUSIVE lock on `table` and its default partition, so it
+    waits at most `DETACH_LOCK_TIMEOUT` for that lock and backs off when it
+    cannot get it, instead of stalling every write queued behind it.
+
+    :param then: A statement on the detached table, e.g. moving or dropping it
+    """
+    delay = 1.0
+    for attempt in range(DETACH_RETRIES + 1):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                conn.execute(text(then))
+            return
+        except DBAPIError as e:
+            pgcode = getattr(e.orig, "pgcode", None)
+            if pgcode != LOCK_NOT_AVAILABLE_SQLSTATE or attempt == DETACH_RETRIES:
+                raise
+            logger.warning(
+                "Could not lock %s to detach %s (attempt %d of %d), retrying in %.1fs",
+                table,
+                name,
+                attempt + 1,
+                DETACH_RETRIES + 1,
+                delay,
+            )
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 30.0)
+
+
+def detach_partition(engine, table, name):
+    """Detach a partition and move it to the archive schema."""
+    detach(engine, table, name, f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+
+
+def move_partition(engine, table, name, batch_size):
+    """
+    Move the rows of a partition into `archive.<table>` in batches, then drop it.
+
+    Every batch is its own short transaction, so locks are held briefly and
+    the move can be interrupted and resumed.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.{table} (LIKE {table})")
+        )
+    moved = batch_size
+    while moved == batch_size:
+        with engine.begin() as conn:
+            moved = conn.execute(
+                text(
+                    f"WITH moved AS ("
+                    f"DELETE FROM {name} WHERE ctid IN "
+                    f"(SELECT ctid FROM {name} LIMIT :batch_size) RETURNING *) "
+                    f"INSERT INTO {ARCHIVE_SCHEMA}.{table} SELECT * FROM moved"
+                ),
+                {"batch_size": batch_size},
+            ).rowcount
+        logger.info("Moved %s rows from %s to the archive", moved, name)
+    detach(engine, table, name, f"DROP TABLE {name}")
+
+
+def archive_partitions(
+    engine, older_than_months, mode="detach", batch_size=10000, now=None
+):
+    """
+    Archive every monthly partition that ended more than `older_than_months` ago.
+
+    :param engine: The engine of the database to archive
+    :param older_than_months: Number of whole months to keep attached
+    :param mode: "detach" to move whole partitions into the archive schema,
+                 "move" to copy rows into archive tables in batches
+    :param batch_size: Rows per transaction in "move" mode
+    :return: The names of the archived partitions
+    :rtype: list
+    """
+    cutoff = add_months(
+        month_start(now or datetime.now(timezone.utc)), -older_than_months
+    )
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+
+    archived = []
+    for table in PARTITIONED_TABLES:
+        with engine.connect() as conn:
+            partitions = list_partitions(conn, table)
+        for name, start in partitions:
+            if add_months(start, 1) > cutoff:
+                continue
+            logger.info("Archiving partition %s (%s mode)", name, mode)
+            if mode == "detach":
+                detach_partition(engine, table, name)
+            else:
+                move_partition(engine, table, name, batch_size)
+            archived.append(name)
+    return archived
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage order partitions")
+    parser.add_argument(
+        "--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI", "")
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ensure = commands.add_parser("ensure", help="Create upcoming partitions")
+    ensure.add_argument("--months-ahead", type=int, default=2)
+
+    archive = commands.add_parser("archive", help="Archive old partitions")
+    archive.add_argument("--older-than-months", type=int, default=12)
+    archive.add_argument("--mode", choices=["detach", "move"], default="detach")
+    archive.add_argument("--batch-size", type=int, default=10000)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    engine = create_engine(args.database_url)
+    if args.command == "ensure":
+        with engine.begin() as conn:
+            ensure_partitions(conn, args.months_ahead)
+    else:
+        archived = archive_partitions(
+            engine, args.older_than_months, args.mode, args.batch_size
+        )
+        logger.info("Archived %s partitions", len(archived))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from pydantic_core import to_json
+from sqlalchemy import func, select, update
+
+from utils.tracing import span
+
+
+def schema_columns(model, schema):
+    """Return the model's columns for every field of a response schema."""
+    table_columns = model.__table__.columns
+    return [
+        table_columns[name] for name in schema.model_fields if name in table_columns
+    ]
+
+
+def select_rows(session, model, schema, *criteria):
+    """
+    Select only the schema's columns as lightweight row tuples.
+
+    No ORM objects are created, so nothing is added to the identity map and
+    there is no per-row `_sa_instance_state`.
+
+    :return: The column names and the result rows
+    :rtype: tuple
+    """
+    columns = schema_columns(model, schema)
+    rows = session.execute(select(*columns).where(*criteria)).all()
+    return [column.name for column in columns], rows
+
+
+def update_returning(session, model, schema, values, *criteria):
+    """
+    Update the matching rows and read them back in one `UPDATE ... RETURNING`.
+
+    `updated_at` is set along with `values`. ORM `before_update` listeners do
+    not run for this statement, so derived columns must be part of `values`.
+
+    :return: The column names and the updated rows
+    :rtype: tuple
+    """
+    columns = schema_columns(model, schema)
+    rows = session.execute(
+        update(model)
+        .where(*criteria)
+        .values(**values, updated_at=func.now())
+        .returning(*columns),
+        execution_options={"synchronize_session": False},
+    ).all()
+    return [column.name for column in columns], rows
+
+
+def rows_to_json(keys, rows):
+    """
+    Serialize rows as `{"data": [...], "count": n}` straight from the result.
+
+    Rows are encoded one at a time with pydantic's serializer, so the output
+    matches `model_dump_json` while only one short-lived dict exists at a time
+    instead of an ORM object, its `__dict__` and a model per row.
+    """
+    with span("serialization", rows=len(rows)):
+        data = b",".join(to_json(dict(zip(keys, row))) for row in rows)
+        return b'{"data":[' + data + b'],"count":' + str(len(rows)).encode() + b"}"
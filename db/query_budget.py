@@ -0,0 +1,147 @@
+import json
+import os
+from collections import namedtuple
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+QueryBudget = namedtuple("QueryBudget", ["statement_timeout_ms", "max_queries"])
+
+# query_canceled, which is what statement_timeout raises
+STATEMENT_TIMEOUT_SQLSTATE = "57014"
+
+
+class QueryBudgetExceeded(Exception):
+    """A request that went over its query budget, answered with `status`."""
+
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def query_budget(statement_timeout_ms=None, max_queries=None):
+    """Declare the query budget of one view, 0 meaning unlimited."""
+
+    def decorate(view):
+        view.query_budget = QueryBudget(statement_timeout_ms, max_queries)
+        return view
+
+    return decorate
+
+
+def resolve_budget(app, endpoint, blueprint):
+    """
+    Return the query budget of an endpoint.
+
+    Each limit is taken from the first of these that sets it: `QUERY_BUDGETS`
+    for the endpoint, the view's `@query_budget`, `QUERY_BUDGETS` for the
+    blueprint, then `QUERY_STATEMENT_TIMEOUT_MS` and `QUERY_MAX_QUERIES`.
+    """
+    budgets = app.config["QUERY_BUDGETS"]
+    view = app.view_functions.get(endpoint)
+    declared = getattr(view, "query_budget", QueryBudget(None, None))._asdict()
+    candidates = (budgets.get(endpoint, {}), declared, budgets.get(blueprint, {}))
+    limits = {}
+    for name, default in (
+        ("statement_timeout_ms", app.config["QUERY_STATEMENT_TIMEOUT_MS"]),
+        ("max_queries", app.config["QUERY_MAX_QUERIES"]),
+    ):
+        limits[name] = next(
+            (
+                candidate[name]
+                for candidate in candidates
+                if candidate.get(name) is not None
+            ),
+            default,
+        )
+    return QueryBudget(**limits)
+
+
+def _current_budget():
+    if not has_request_context():
+        return None
+    return g.get("query_budget")
+
+
+def _set_statement_timeout(session, transaction, connection):
+    budget = _current_budget()
+    if budget is None or not budget.statement_timeout_ms:
+        return
+    if connection.dialect.name != "postgresql":
+        return
+    # On the raw DBAPI connection, so the SET is not counted as a query
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            f"SET LOCAL statement_timeout = {int(budget.statement_timeout_ms)}"
+        )
+    finally:
+        cursor.close()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    budget = _current_budget()
+    if budget is None:
+        return
+    g.query_count += 1
+    if budget.max_queries and g.query_count > budget.max_queries:
+        raise QueryBudgetExceeded(
+            503, f"Query budget of {budget.max_queries} queries exceeded"
+        )
+
+
+def _translate_timeout(exception_context):
+    budget = _current_budget()
+    if budget is None:
+        return None
+    error = exception_context.original_exception
+    if getattr(error, "pgcode", None) != STATEMENT_TIMEOUT_SQLSTATE:
+        return None
+    return QueryBudgetExceeded(
+        504, f"Statement timeout of {budget.statement_timeout_ms} ms exceeded"
+    )
+
+
+def configure_query_budgets(app):
+    """
+    Limit how long each statement of a request may run and how many it may run.
+
+    The statement timeout is applied with `SET LOCAL` at the start of every
+    transaction of the request, so it ends with the transaction and never
+    leaks to the next user of the pooled connection. Postgres only.
+    """
+    app.config["QUERY_STATEMENT_TIMEOUT_MS"] = int(
+        os.getenv("QUERY_STATEMENT_TIMEOUT_MS", "10000")
+    )
+    app.config["QUERY_MAX_QUERIES"] = int(os.getenv("QUERY_MAX_QUERIES", "200"))
+    # Checkout pays through /payment/. Its writes can wait on row locks held
+    # by other checkouts, so it gets more time than the default, not less;
+    # the expensive reads it competes with declare tight budgets instead.
+    app.config["QUERY_BUDGETS"] = {
+        "payment": {"statement_timeout_ms": 30000},
+        **json.loads(os.getenv("QUERY_BUDGETS", "{}")),
+    }
+
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            event.listen(engine, "before_cursor_execute", _count_query)
+            event.listen(engine, "handle_error", _translate_timeout)
+    if not event.contains(Session, "after_begin", _set_statement_timeout):
+        event.listen(Session, "after_begin", _set_statement_timeout)
+
+    @app.before_request
+    def start_query_budget():
+        g.query_budget = resolve_budget(app, request.endpoint, request.blueprint)
+        g.query_count = 0
+
+    @app.errorhandler(QueryBudgetExceeded)
+    def handle_query_budget_exceeded(e):
+        app.logger.warning(
+            "Query budget exceeded on %s after %d queries: %s",
+            request.endpoint,
+            g.get("query_count", 0),
+            e.error,
+        )
+        return jsonify({"data": [], "error": e.error}), e.status
@@ -0,0 +1,469 @@
+"""
+Generate deterministic, realistic volumes of data for scale testing.
+
+    python -m db.seed --orders 2000000 --workers 8 --seed 42
+
+Every chunk of rows is generated from its own random stream derived from
+`--seed`, and timestamps are laid out backwards from a fixed `--now`, so the
+same arguments always produce the same data no matter how many workers are
+used or when the command runs. Postgres is loaded with COPY from each worker
+process. Other databases such as SQLite have a single writer, so workers only
+generate rows and the parent inserts them in batches.
+
+On a partitioned Postgres schema the monthly partitions of the whole date
+range are created first, so no seeded row lands in a default partition.
+"""
+
+import argparse
+import csv
+import io
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.pool import NullPool
+
+from db.models import Base, Customer, MenuItem, Order, OrderItem, PaymentTransaction
+from db.partitions import ensure_partitions, is_partitioned
+
+logger = logging.getLogger(__name__)
+
+# Relative order volume for each hour of the day, with lunch and dinner peaks
+HOUR_WEIGHTS = [
+    0.2, 0.1, 0.05, 0.05, 0.05, 0.1, 0.4, 1.2, 2.0, 1.8, 1.5, 2.5,
+    5.0, 5.5, 3.0, 1.5, 1.4, 2.0, 3.5, 5.0, 4.8, 3.0, 1.5, 0.6,
+]  # fmt: skip
+WEEKEND_WEIGHT = 1.3
+
+# Orders from the last couple of hours are still being worked on
+RECENT_WINDOW = timedelta(hours=2)
+RECENT_STATUS_WEIGHTS = {
+    "PENDING": 0.3,
+    "IN_PROGRESS": 0.35,
+    "READY": 0.25,
+    "PICKED_UP": 0.05,
+    "CANCELLED": 0.05,
+}
+HISTORIC_STATUS_WEIGHTS = {"PICKED_UP": 0.94, "CANCELLED": 0.06}
+PAYMENT_METHOD_WEIGHTS = {"CARD": 0.42, "UPI": 0.33, "CASH": 0.2, "OTHERS": 0.05}
+ITEMS_PER_ORDER_WEIGHTS = {1: 0.15, 2: 0.25, 3: 0.25, 4: 0.15, 5: 0.1, 6: 0.05, 8: 0.05}
+QUANTITY_WEIGHTS = {1: 0.6, 2: 0.25, 3: 0.1, 4: 0.05}
+# Item ids are allotted in blocks of this size per order, so they do not
+# depend on the order in which chunks are loaded
+MAX_ITEMS_PER_ORDER = max(ITEMS_PER_ORDER_WEIGHTS)
+
+FIRST_NAMES = [
+    "Aarav", "Ananya", "Diya", "Ishaan", "Kabir", "Meera", "Neha", "Rohan",
+    "Saanvi", "Vihaan", "Aditi", "Arjun", "Kavya", "Riya", "Sai", "Zara",
+]  # fmt: skip
+LAST_NAMES = [
+    "Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Khan", "Singh",
+    "Das", "Menon", "Rao", "Joshi", "Bose", "Kapoor", "Pillai", "Verma",
+]  # fmt: skip
+MENU_WORDS = [
+    "Paneer", "Chicken", "Veggie", "Masala", "Grilled", "Spicy", "Classic",
+    "Cheese", "Tandoori", "Garlic", "Crispy", "Smoky",
+]  # fmt: skip
+MENU_DISHES = [
+    "Burger", "Wrap", "Bowl", "Pizza", "Salad", "Fries", "Sandwich", "Rice",
+    "Noodles", "Tacos",
+]  # fmt: skip
+
+AUDIT = "seed"
+
+# The moment generated data treats as "now", unless --now says otherwise
+DEFAULT_NOW = datetime(2025, 6, 30, 18, 0, tzinfo=timezone.utc)
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _chunk_rng(seed, table, chunk):
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def _audit(at):
+    return {
+        "created_at": at,
+        "updated_at": at,
+        "created_by": AUDIT,
+        "updated_by": AUDIT,
+    }
+
+
+def generate_customers(seed, chunk, first_id, count, start):
+    rng = _chunk_rng(seed, "customers", chunk)
+    rows = []
+    for customer_id in range(first_id, first_id + count):
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        rows.append(
+            {
+                "id": customer_id,
+                "name": f"{first_name} {last_name}",
+                "phone_number": f"+91{rng.randrange(6_000_000_000, 9_999_999_999)}",
+                "email": (
+                    f"{first_name}.{last_name}{customer_id}@example.com".lower()
+                    if rng.random() < 0.7
+                    else None
+                ),
+                **_audit(start),
+            }
+        )
+    return rows
+
+
+def generate_orders(
+    seed, chunk, first_id, count, customers, menu, start, now, id_bases
+):
+    """
+    Generate `count` orders with their items and payments.
+
+    :param id_bases: The first (order, order item, payment) id of the whole run,
+                     which item and payment ids are derived from
+    :return: A dict of table name -> list of row dictionaries
+    :rtype: dict
+    """
+    first_order, first_item, first_payment = id_bases
+    rng = _chunk_rng(seed, "orders", chunk)
+    days = max(1, (now - start).days)
+    day_weights = [
+        WEEKEND_WEIGHT if (start + timedelta(days=day)).weekday() >= 5 else 1.0
+        for day in range(days + 1)
+    ]
+    orders, order_items, payments = [], [], []
+    for order_id in range(first_id, first_id + count):
+        day = rng.choices(range(days + 1), weights=day_weights)[0]
+        hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+        order_date = start + timedelta(
+            days=day, hours=hour, seconds=rng.randrange(3600)
+        )
+        if order_date > now:
+            order_date = now - timedelta(seconds=rng.randrange(7200))
+        status = _weighted(
+            rng,
+            (
+                RECENT_STATUS_WEIGHTS
+                if now - order_date <= RECENT_WINDOW
+                else HISTORIC_STATUS_WEIGHTS
+            ),
+        )
+        orders.append(
+            {
+                "id": order_id,
+                "customer_id": rng.randrange(customers[0], customers[1] + 1),
+                "order_date": order_date,
+                "status": status,
+                **_audit(order_date),
+            }
+        )
+
+        total = 0.0
+        item_block = first_item + (order_id - first_order) * MAX_ITEMS_PER_ORDER
+        for index, (menu_item_id, price) in enumerate(
+            rng.sample(menu, min(len(menu), _weighted(rng, ITEMS_PER_ORDER_WEIGHTS)))
+        ):
+            quantity = _weighted(rng, QUANTITY_WEIGHTS)
+            total += price * quantity
+            order_items.append(
+                {
+                    "id": item_block + index,
+                    "order_id": order_id,
+                    "menu_item_id": menu_item_id,
+                    "quantity": quantity,
+                    "unit_price": price,
+                    "line_total": price * quantity,
+                    **_audit(order_date),
+                }
+            )
+
+        if status != "CANCELLED":
+            payment_date = order_date + timedelta(seconds=rng.randrange(30, 900))
+            payments.append(
+                {
+                    "id": first_payment + order_id - first_order,
+                    "order_id": order_id,
+                    "payment_date": payment_date,
+                    "amount": round(total, 2),
+                    "payment_method": _weighted(rng, PAYMENT_METHOD_WEIGHTS),
+                    "paid": status == "PICKED_UP" or rng.random() < 0.5,
+                    **_audit(payment_date),
+                }
+            )
+    return {
+        Order.__tablename__: orders,
+        OrderItem.__tablename__: order_items,
+        PaymentTransaction.__tablename__: payments,
+    }
+
+
+def _copy_rows(connection, table_name, rows):
+    """Load rows into a Postgres table with COPY ... FROM STDIN."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            ["" if row[column] is None else row[column] for column in columns]
+        )
+    buffer.seek(0)
+    cursor = connection.cursor()
+    cursor.copy_expert(
+        f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
+    cursor.close()
+
+
+def _insert_rows(connection, table_name, rows, batch_size):
+    """Load rows with batched executemany INSERTs."""
+    table = Base.metadata.tables[table_name]
+    for offset in range(0, len(rows), batch_size):
+        connection.execute(table.insert(), rows[offset : offset + batch_size])
+
+
+def _run_task(task):
+    """
+    Generate one chunk, and load it too when the database supports parallel COPY.
+
+    :return: The generated tables when the parent must load them, else row counts
+    """
+    kind, database_url, copy, arguments = task
+    tables = (
+        {Customer.__tablename__: generate_customers(*arguments)}
+        if kind == "customers"
+        else generate_orders(*arguments)
+    )
+    if not copy:
+        return tables
+    engine = create_engine(database_url, poolclass=NullPool)
+    connection = engine.raw_connection()
+    try:
+        for table_name, rows in tables.items():
+            _copy_rows(connection, table_name, rows)
+        connection.commit()
+    finally:
+        connection.close()
+        engine.dispose()
+    return {table_name: len(rows) for table_name, rows in tables.items()}
+
+
+def _ensure_menu(engine, seed, count, now):
+    """Return (id, price) for the active menu, creating items if there are none."""
+    with engine.begin() as conn:
+        menu = conn.execute(
+            select(MenuItem.id, MenuItem.price)
+            .where(MenuItem.active)
+            .order_by(MenuItem.id)
+        ).all()
+        if menu:
+            return [tuple(row) for row in menu]
+        rng = _chunk_rng(seed, "menu_items", 0)
+        conn.execute(
+            MenuItem.__table__.insert(),
+            [
+                {
+                    "name": f"{rng.choice(MENU_WORDS)} {rng.choice(MENU_DISHES)} #{index}",
+                    "description": "Seeded menu item",
+                    "price": round(rng.uniform(2.5, 18.0), 2),
+                    "active": True,
+                    **_audit(now),
+                }
+                for index in range(count)
+            ],
+        )
+        menu = conn.execute(
+            select(MenuItem.id, MenuItem.price).order_by(MenuItem.id)
+        ).all()
+        return [tuple(row) for row in menu]
+
+
+def _next_id(engine, model):
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _reset_sequences(engine):
+    with engine.begin() as conn:
+        for model in (Customer, Order, OrderItem, PaymentTransaction):
+            table_name = model.__tablename__
+            conn.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table_name}))"
+                )
+            )
+
+
+def seed(
+    database_url,
+    orders,
+    customers,
+    menu_items=40,
+    days=365,
+    seed_value=42,
+    workers=None,
+    chunk_size=50000,
+    batch_size=5000,
+    create_schema=False,
+    now=DEFAULT_NOW,
+):
+    """
+    Seed the database and return the number of rows loaded per table.
+
+    :param now: The moment the newest orders are placed at
+    :rtype: dict
+    """
+    engine = create_engine(database_url)
+    if create_schema:
+        Base.metadata.create_all(engine)
+    copy = engine.dialect.name == "postgresql"
+    now = now.replace(microsecond=0)
+    menu = _ensure_menu(engine, seed_value, menu_items, now)
+    start = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0)
+    if copy:
+        with engine.begin() as conn:
+            if is_partitioned(conn, Order.__tablename__):
+                # Payments can be dated up to 15 minutes past `now`, into
+                # the next month
+                ensure_partitions(conn, months_ahead=1, now=now, since=start)
+
+    first_customer = _next_id(engine, Customer)
+    first_order = _next_id(engine, Order)
+    id_bases = (
+        first_order,
+        _next_id(engine, OrderItem),
+        _next_id(engine, PaymentTransaction),
+    )
+    customer_range = (first_customer, first_customer + customers - 1)
+    tasks = [
+        (
+            "customers",
+            database_url,
+            copy,
+            (
+                seed_value,
+                chunk,
+                first_customer + offset,
+                min(chunk_size, customers - offset),
+                start,
+            ),
+        )
+        for chunk, offset in enumerate(range(0, customers, chunk_size))
+    ]
+    order_tasks = [
+        (
+            "orders",
+            database_url,
+            copy,
+            (
+                seed_value,
+                chunk,
+                first_order + offset,
+                min(chunk_size, orders - offset),
+                customer_range,
+                menu,
+                start,
+                now,
+                id_bases,
+            ),
+        )
+        for chunk, offset in enumerate(range(0, orders, chunk_size))
+    ]
+
+    loaded = {}
+    with Pool(workers or os.cpu_count()) as pool:
+        # Customers must exist before the orders that reference them
+        for task_list in (tasks, order_tasks):
+            for result in pool.imap_unordered(_run_task, task_list):
+                if copy:
+                    counts = result
+                else:
+                    with engine.begin() as conn:
+                        for table_name, rows in result.items():
+                            _insert_rows(conn, table_name, rows, batch_size)
+                    counts = {name: len(rows) for name, rows in result.items()}
+                for table_name, count in counts.items():
+                    loaded[table_name] = loaded.get(table_name, 0) + count
+                logger.info("Loaded %s", loaded)
+
+    if copy:
+        _reset_sequences(engine)
+    engine.dispose()
+    return loaded
+
+
+def parse_now(value):
+    """Parse --now, an ISO 8601 timestamp (UTC if no offset) or "now"."""
+    if value == "now":
+        return datetime.now(timezone.utc)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed order_genie with test data")
+    parser.add_argument(
+        "--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI", "")
+    )
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument(
+        "--customers", type=int, help="Defaults to one customer per 10 orders"
+    )
+    parser.add_argument("--menu-items", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--now",
+        type=parse_now,
+        default=DEFAULT_NOW,
+        help="Timestamp the data is generated up to, ISO 8601 or 'now' "
+        f"(default {DEFAULT_NOW.isoformat()})",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--create-schema",
+        action="store_true",
+        help="Create missing tables first (useful for SQLite)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    started = time.perf_counter()
+    loaded = seed(
+        args.database_url,
+        orders=args.orders,
+        customers=args.customers or max(1, args.orders // 10),
+        menu_items=args.menu_items,
+        days=args.days,
+        seed_value=args.seed,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        create_schema=args.create_schema,
+        now=args.now,
+    )
+    elapsed = time.perf_counter() - started
+    total = sum(loaded.values())
+    logger.info(
+        "Loaded %s rows in %.1fs (%.0f rows/s): %s",
+        total,
+        elapsed,
+        total / elapsed,
+        loaded,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, has_app_context
+from flask.globals import app_ctx
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+SHARD_BIND_PREFIX = "shard:"
+
+
+def load_shard_map():
+    """
+    Read the outlet to database URI map from SHARD_MAP.
+
+    SHARD_MAP is a JSON object, e.g. `{"blr-01": "postgresql://...", ...}`.
+    """
+    raw = os.getenv("SHARD_MAP", "")
+    return json.loads(raw) if raw else {}
+
+
+def shard_binds(shard_map):
+    """Return the flask_sqlalchemy binds for a shard map, one per outlet."""
+    return {
+        f"{SHARD_BIND_PREFIX}{outlet}": database_uri
+        for outlet, database_uri in shard_map.items()
+    }
+
+
+def _app_ctx_id():
+    return id(app_ctx._get_current_object())
+
+
+class ShardRouter:
+    """
+    Sessions for each outlet's database.
+
+    Each outlet has its own pooled engine (a flask_sqlalchemy bind) and a
+    session scoped to the app context, like `db.session`.
+    """
+
+    def __init__(self, db, shard_map, session_options):
+        self.shard_map = shard_map
+        self._sessionmakers = {}
+        self._sessions = {}
+        for outlet in shard_map:
+            factory = sessionmaker(
+                bind=db.engines[f"{SHARD_BIND_PREFIX}{outlet}"], **session_options
+            )
+            self._sessionmakers[outlet] = factory
+            self._sessions[outlet] = scoped_session(factory, scopefunc=_app_ctx_id)
+
+    def outlets(self):
+        return list(self.shard_map)
+
+    def session(self, outlet):
+        """
+        Return the current app context's session for an outlet.
+
+        :raises KeyError: If the outlet is not in the shard map
+        """
+        return self._sessions[outlet]()
+
+    def remove(self):
+        for registry in self._sessions.values():
+            registry.remove()
+
+    def fan_out(self, query, outlets=None, max_workers=None, return_exceptions=False):
+        """
+        Run `query(session, outlet)` against several shards in parallel.
+
+        Each call gets its own short-lived session, so this is safe to use
+        from a request alongside `g.session`.
+
+        :param query: A callable taking a session and an outlet id
+        :param outlets: The outlets to query, all of them by default
+        :param max_workers: Parallel queries, one per outlet by default
+        :param return_exceptions: Return a shard's exception as its result
+            instead of raising it
+        :return: The result of each outlet's query, keyed by outlet
+        :rtype: dict
+        """
+        outlets = self.outlets() if outlets is None else list(outlets)
+        if not outlets:
+            return {}
+
+        def run(outlet):
+            with self._sessionmakers[outlet]() as session:
+                return query(session, outlet)
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers or len(outlets), thread_name_prefix="shard"
+        ) as executor:
+            futures = {outlet: executor.submit(run, outlet) for outlet in outlets}
+
+        results = {}
+        for outlet, future in futures.items():
+            exception = future.exception()
+            if exception is not None and not return_exceptions:
+                raise exception
+            results[outlet] = exception if exception is not None else future.result()
+        return results
+
+
+def get_shard_router():
+    """Return the app's shard router."""
+    return current_app.extensions["shards"]
+
+
+def current_outlet():
+    """Return the outlet of the current request, or None for the default database."""
+    if not has_app_context():
+        return None
+    return g.get("outlet")
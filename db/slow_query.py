@@ -0,0 +1,274 @@
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Distinct statements tracked before new ones are folded into one bucket
+MAX_STATEMENTS = 5000
+OTHER_STATEMENTS = "<other statements>"
+
+# Slow statements waiting for their EXPLAIN before new ones are dropped
+EXPLAIN_QUEUE_SIZE = 100
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\?|%s|%\(\w+\)s|\$\d+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\(\?\))(?:\s*,\s*\(\?\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_LOCKING_CLAUSE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement):
+    """
+    Reduce a statement to its shape so that executions can be grouped.
+
+    Literals become "?", placeholder lists such as `IN (%(id_1)s, %(id_2)s)`
+    collapse to `(?)`, and whitespace is squashed.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(?)", normalized)
+    normalized = _VALUES_LIST.sub(r"\1", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+def locks_rows(normalized):
+    """Whether a normalized SELECT takes row locks, e.g. `FOR UPDATE SKIP LOCKED`."""
+    return bool(_LOCKING_CLAUSE.search(normalized))
+
+
+def parameters_shape(parameters, executemany):
+    """Describe the parameters by type only, so no values end up in the logs."""
+    if executemany and parameters:
+        return {"rows": len(parameters), "row": parameters_shape(parameters[0], False)}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """
+    Aggregate statement timings and keep the statements slower than a threshold.
+
+    With `explain` enabled, the first slow execution of each SELECT shape is
+    re-run under `EXPLAIN (ANALYZE, BUFFERS)` and the plan is stored with it.
+    EXPLAIN ANALYZE executes the query again, so this is meant for
+    non-production environments only. It runs in a background thread on a
+    connection of its own, so the request that ran the slow query neither
+    waits for it nor shares a transaction with it. A SELECT that locks rows
+    (`FOR UPDATE`, `FOR SHARE`, ...) only gets a plain EXPLAIN: executing it
+    would wait on the locks the request still holds.
+    """
+
+    def __init__(
+        self, threshold_ms, explain=False, buffer_size=200, explain_timeout_ms=5000
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_timeout_ms = explain_timeout_ms
+        self.slow_queries = deque(maxlen=buffer_size)
+        self.statements = {}
+        self.plans = {}
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._explain_thread = None
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        started = conn.info["slow_query_start"].pop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        normalized = normalize_statement(statement)
+        self.record(normalized, duration_ms)
+        if duration_ms < self.threshold_ms:
+            return
+
+        entry = {
+            "statement": normalized,
+            "parameters": parameters_shape(parameters, executemany),
+            "route": request.endpoint if has_request_context() else None,
+            "duration_ms": round(duration_ms, 3),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "plan": None,
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+        if self.explain and not executemany and conn.dialect.name == "postgresql":
+            self.request_plan(conn.engine, statement, parameters, normalized, entry)
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s",
+            duration_ms,
+            entry["route"],
+            normalized,
+        )
+
+    def handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("slow_query_start"):
+            connection.info["slow_query_start"].pop()
+
+    def record(self, normalized, duration_ms):
+        with self._lock:
+            stats = self.statements.get(normalized)
+            if stats is None:
+                if len(self.statements) >= MAX_STATEMENTS:
+                    normalized = OTHER_STATEMENTS
+                stats = self.statements.setdefault(
+                    normalized, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+                )
+            stats["calls"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+    def request_plan(self, engine, statement, parameters, normalized, entry):
+        """
+        Attach the plan of a slow SELECT to `entry`, capturing it if needed.
+
+        Plans are captured once per statement shape, in the background. When
+        the queue is full the statement is skipped and captured the next time
+        it is slow.
+        """
+        if not statement.lstrip().upper().startswith("SELECT"):
+            return
+        with self._lock:
+            if normalized in self.plans:
+                entry["plan"] = self.plans[normalized]
+                return
+            self.plans[normalized] = None
+            if self._explain_thread is None:
+                self._explain_thread = threading.Thread(
+                    target=self._explain_worker, name="slow-query-explain", daemon=True
+                )
+                self._explain_thread.start()
+        try:
+            self._explain_queue.put_nowait(
+                (engine, statement, parameters, normalized, entry)
+            )
+        except queue.Full:
+            with self._lock:
+                del self.plans[normalized]
+
+    def _explain_worker(self):
+        while True:
+            engine, statement, parameters, normalized, entry = self._explain_queue.get()
+            plan = self.explain_plan(
+                engine, statement, parameters, analyze=not locks_rows(normalized)
+            )
+            with self._lock:
+                self.plans[normalized] = plan
+                entry["plan"] = plan
+
+    def explain_plan(self, engine, statement, parameters, analyze=True):
+        """
+        Return the EXPLAIN (ANALYZE, BUFFERS) plan of a slow SELECT, or the
+        plain EXPLAIN plan without `analyze`.
+
+        The EXPLAIN runs on a raw DBAPI cursor of a separate pooled connection,
+        so it does not re-enter these event hooks, under a statement timeout,
+        and in a transaction that is rolled back.
+
+        :param analyze: Execute the statement for actual timings; without it
+            the plan is estimated only and the statement takes no row locks
+        """
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        try:
+            with engine.connect() as conn:
+                dbapi_connection = conn.connection.dbapi_connection
+                explain_cursor = dbapi_connection.cursor()
+                try:
+                    explain_cursor.execute(
+                        "SET LOCAL statement_timeout = %s",
+                        (int(self.explain_timeout_ms),),
+                    )
+                    explain_cursor.execute(
+                        f"EXPLAIN ({options}) " + statement,
+                        parameters,
+                    )
+                    return explain_cursor.fetchone()[0]
+                finally:
+                    explain_cursor.close()
+                    dbapi_connection.rollback()
+        except Exception as e:
+            logger.warning("Could not EXPLAIN slow query: %s", e)
+            return None
+
+    def top_statements(self, limit=20, order_by="total_ms"):
+        """
+        Return the statements with the highest total (or max, or call count) time.
+
+        :rtype: list
+        """
+        with self._lock:
+            rows = [
+                {
+                    "statement": statement,
+                    "calls": stats["calls"],
+                    "total_ms": round(stats["total_ms"], 3),
+                    "mean_ms": round(stats["total_ms"] / stats["calls"], 3),
+                    "max_ms": round(stats["max_ms"], 3),
+                    "has_plan": self.plans.get(statement) is not None,
+                }
+                for statement, stats in self.statements.items()
+            ]
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:limit]
+
+    def recent(self):
+        """Return the recorded slow queries, newest first."""
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+
+def configure_slow_query_log(app):
+    """Attach the slow query log to every engine of the app."""
+    app.config["SLOW_QUERY_THRESHOLD_MS"] = float(
+        os.getenv("SLOW_QUERY_THRESHOLD_MS", "200")
+    )
+    app.config["SLOW_QUERY_EXPLAIN"] = (
+        os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    )
+    app.config["SLOW_QUERY_EXPLAIN_TIMEOUT_MS"] = int(
+        os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000")
+    )
+    app.config["SLOW_QUERY_BUFFER_SIZE"] = int(
+        os.getenv("SLOW_QUERY_BUFFER_SIZE", "200")
+    )
+
+    slow_query_log = SlowQueryLog(
+        app.config["SLOW_QUERY_THRESHOLD_MS"],
+        explain=app.config["SLOW_QUERY_EXPLAIN"],
+        buffer_size=app.config["SLOW_QUERY_BUFFER_SIZE"],
+        explain_timeout_ms=app.config["SLOW_QUERY_EXPLAIN_TIMEOUT_MS"],
+    )
+    app.extensions["slow_query_log"] = slow_query_log
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            event.listen(
+                engine, "before_cursor_execute", slow_query_log.before_cursor_execute
+            )
+            event.listen(
+                engine, "after_cursor_execute", slow_query_log.after_cursor_execute
+            )
+            event.listen(engine, "handle_error", slow_query_log.handle_error)
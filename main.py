@@ -1,16 +1,33 @@
 from flask import Flask
 
 from db.db_session import configure_db_session
+from db.query_budget import configure_query_budgets
+from db.slow_query import configure_slow_query_log
+from utils.cache import configure_caches
+from utils.health import configure_health
+from utils.invalidation import configure_invalidation
+from utils.request_body import configure_request_decoding
 from utils.routes import register_routes
-from utils.logger import configure_logging, configure_request_handler
-from logging.config import dictConfig
+from utils.snapshot import configure_snapshots
+from utils.tasks import configure_tasks
+from utils.tracing import configure_tracing
+from utils.logger import configure_request_handler, setup_logging
 
 
 def create_app():
-    dictConfig(configure_logging())
+    setup_logging()
     app = Flask(__name__)
     configure_db_session(app)
+    configure_slow_query_log(app)
+    configure_query_budgets(app)
+    configure_caches(app)
+    configure_snapshots(app)
+    configure_invalidation(app)
+    configure_health(app)
+    configure_tasks(app)
+    configure_tracing(app)
     configure_request_handler(app)
+    configure_request_decoding(app)
     register_routes(app)
     return app
 
@@ -0,0 +1,456 @@
+"""
+Low-lock building blocks for migrations on busy tables.
+
+Every helper runs its statements outside the migration transaction, one
+statement per transaction, with a short `lock_timeout` so a statement that
+queues behind a long running query gives up quickly instead of blocking
+every query queued behind it. Timed out statements are retried with backoff.
+
+In offline mode (`alembic upgrade head --sql`) nothing is executed; the SQL
+of each step is printed preceded by the lock it takes and what that lock
+blocks, so a migration can be reviewed before it is run. See the README in
+this directory for the conventions.
+"""
+
+import hashlib
+import logging
+import random
+import re
+import time
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger("alembic.helpers")
+
+LOCK_TIMEOUT = "2s"
+STATEMENT_TIMEOUT = "0"
+RETRIES = 10
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+# lock_not_available and query_canceled (statement_timeout)
+RETRYABLE_SQLSTATES = {"55P03", "57014"}
+
+# (pattern, lock, impact), first match wins
+LOCK_IMPACT = (
+    (
+        r"^CREATE (UNIQUE )?INDEX CONCURRENTLY",
+        "SHARE UPDATE EXCLUSIVE",
+        "reads and writes continue, other DDL waits",
+    ),
+    (
+        r"^DROP INDEX CONCURRENTLY",
+        "SHARE UPDATE EXCLUSIVE",
+        "reads and writes continue, other DDL waits",
+    ),
+    (
+        r"^CREATE (UNIQUE )?INDEX .* ON ONLY",
+        "SHARE",
+        "writes wait, instant (no partitions are indexed)",
+    ),
+    (
+        r"^CREATE (UNIQUE )?INDEX",
+        "SHARE",
+        "writes wait for the whole build",
+    ),
+    (
+        r"^ALTER INDEX .* ATTACH PARTITION",
+        "SHARE UPDATE EXCLUSIVE",
+        "reads and writes continue, instant",
+    ),
+    (
+        r"^ALTER TABLE .* VALIDATE CONSTRAINT",
+        "SHARE UPDATE EXCLUSIVE",
+        "reads and writes continue during the scan",
+    ),
+    (
+        r"^ALTER TABLE .* ADD CONSTRAINT .* FOREIGN KEY .* NOT VALID",
+        "SHARE ROW EXCLUSIVE",
+        "writes wait, instant",
+    ),
+    (
+        r"^ALTER TABLE .* NOT VALID",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait, instant",
+    ),
+    (
+        r"^ALTER TABLE .* SET NOT NULL",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait, instant only with a validated "
+        "IS NOT NULL check constraint, otherwise for a full scan",
+    ),
+    (
+        r"^ALTER TABLE .* ADD COLUMN",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait, instant unless the default is volatile, "
+        "which rewrites the table",
+    ),
+    (
+        r"^ALTER TABLE .* (ALTER COLUMN .* TYPE|SET DATA TYPE)",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait, usually for a full table rewrite",
+    ),
+    (
+        r"^ALTER TABLE",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait",
+    ),
+    (
+        r"^(WITH .*)?UPDATE",
+        "ROW EXCLUSIVE",
+        "reads continue, writes to the updated rows wait",
+    ),
+    (
+        r"^(DROP|TRUNCATE)",
+        "ACCESS EXCLUSIVE",
+        "reads and writes wait",
+    ),
+)
+
+REPLICATION_LAG = sa.text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM max(replay_lag)), 0) FROM pg_stat_replication"
+)
+
+PARTITIONS = sa.text("""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = :table
+    ORDER BY child.relname
+    """)
+
+INDEX_STATE = sa.text("""
+    SELECT pg_index.indisvalid
+    FROM pg_class
+    JOIN pg_index ON pg_index.indexrelid = pg_class.oid
+    WHERE pg_class.relname = :index_name
+    """)
+
+IS_PARTITIONED = sa.text(
+    "SELECT relkind = 'p' FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"
+)
+
+
+def lock_impact(sql):
+    """
+    Return (lock, impact) of a statement on the table it touches.
+
+    :param sql: A single SQL statement
+    :rtype: tuple
+    """
+    statement = " ".join(sql.split()).upper()
+    for pattern, lock, impact in LOCK_IMPACT:
+        if re.search(pattern, statement):
+            return lock, impact
+    return "unknown", "check the Postgres documentation"
+
+
+def is_offline():
+    return op.get_context().as_sql
+
+
+def _describe(sql, note=None):
+    lock, impact = lock_impact(sql)
+    lines = [f"-- lock: {lock} ({impact})"]
+    if note:
+        lines.append(f"-- {note}")
+    op.get_context().impl.static_output("\n".join(lines))
+
+
+def _retryable(error):
+    return getattr(error.orig, "pgcode", None) in RETRYABLE_SQLSTATES
+
+
+def execute(
+    sql,
+    lock_timeout=LOCK_TIMEOUT,
+    statement_timeout=STATEMENT_TIMEOUT,
+    retries=RETRIES,
+    params=None,
+    note=None,
+    scalar=False,
+):
+    """
+    Run one statement in its own transaction, retrying when it times out.
+
+    Must be called inside `op.get_context().autocommit_block()` so a retry
+    does not hold on to locks taken by earlier statements.
+
+    :param sql: A single SQL statement
+    :param lock_timeout: How long to wait for the lock before giving up
+    :param statement_timeout: How long the statement may run, "0" for no limit
+    :param retries: Attempts after the first one before the error is raised
+    :param params: Bind parameters of the statement
+    :param note: An extra line printed with the statement in offline mode
+    :param scalar: Return the first column of the first row instead
+    :return: The number of rows the statement affected
+    :rtype: int
+    """
+    if is_offline():
+        _describe(sql, note)
+        op.execute(f"SET lock_timeout = '{lock_timeout}'")
+        op.execute(f"SET statement_timeout = '{statement_timeout}'")
+        op.execute(sa.text(sql).bindparams(**(params or {})))
+        return None if scalar else 0
+
+    connection = op.get_bind()
+    delay = RETRY_DELAY
+    for attempt in range(retries + 1):
+        connection.execute(sa.text(f"SET lock_timeout = '{lock_timeout}'"))
+        connection.execute(sa.text(f"SET statement_timeout = '{statement_timeout}'"))
+        try:
+            result = connection.execute(sa.text(sql), params or {})
+            return result.scalar() if scalar else result.rowcount
+        except DBAPIError as e:
+            if not _retryable(e) or attempt == retries:
+                raise
+            logger.warning(
+                "Timed out (attempt %d of %d), retrying in %.1fs: %s",
+                attempt + 1,
+                retries + 1,
+                delay,
+                " ".join(sql.split())[:200],
+            )
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+        finally:
+            connection.execute(sa.text("RESET lock_timeout"))
+            connection.execute(sa.text("RESET statement_timeout"))
+
+
+def _identifier(name):
+    """Shorten a generated name to the 63 bytes Postgres keeps, staying unique."""
+    if len(name) <= 63:
+        return name
+    return f"{name[:54]}_{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
+
+def _index_sql(
+    index_name, table, columns, unique, include, where, concurrently, only=False
+):
+    sql = "CREATE UNIQUE INDEX" if unique else "CREATE INDEX"
+    if concurrently:
+        sql += " CONCURRENTLY"
+    sql += f" IF NOT EXISTS {index_name} ON {'ONLY ' if only else ''}{table}"
+    sql += f" ({', '.join(columns)})"
+    if include:
+        sql += f" INCLUDE ({', '.join(include)})"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+def _drop_invalid_index(index_name):
+    """Drop what a failed concurrent build left behind so it can be rebuilt."""
+    if is_offline():
+        return
+    valid = op.get_bind().execute(INDEX_STATE, {"index_name": index_name}).scalar()
+    if valid is False:
+        logger.warning("Dropping invalid index %s left by a failed build", index_name)
+        execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+
+def create_index_concurrently(
+    index_name,
+    table,
+    columns,
+    unique=False,
+    include=None,
+    where=None,
+    partitioned=None,
+):
+    """
+    Build an index without blocking writes.
+
+    On a partitioned table, where CONCURRENTLY is not supported, an invalid
+    index is created on the parent only, each partition is indexed
+    concurrently and attached, and the parent index becomes valid once every
+    partition is attached.
+
+    :param index_name: The index name, also the prefix of the partition indexes
+    :param table: The table name
+    :param columns: Column expressions, e.g. ["customer_id", "order_date DESC"]
+    :param unique: Whether the index is unique
+    :param include: Columns stored in the index but not part of the key
+    :param where: The predicate of a partial index
+    :param partitioned: Whether the table is partitioned, looked up when
+        None; offline mode cannot look it up and assumes it is not
+    """
+    with op.get_context().autocommit_block():
+        if partitioned is None and not is_offline():
+            partitioned = (
+                op.get_bind().execute(IS_PARTITIONED, {"table": table}).scalar()
+            )
+        if not partitioned:
+            _drop_invalid_index(index_name)
+            execute(
+                _index_sql(index_name, table, columns, unique, include, where, True)
+            )
+            return
+
+        execute(
+            _index_sql(
+                index_name, table, columns, unique, include, where, False, only=True
+            )
+        )
+        if is_offline():
+            partitions = [f"{table}_pYYYY_MM"]
+            note = f"repeated for every partition of {table}"
+        else:
+            partitions = (
+                op.get_bind().execute(PARTITIONS, {"table": table}).scalars().all()
+            )
+            note = None
+        for partition in partitions:
+            partition_index = _identifier(f"{index_name}_{partition}")
+            _drop_invalid_index(partition_index)
+            execute(
+                _index_sql(
+                    partition_index, partition, columns, unique, include, where, True
+                ),
+                note=note,
+            )
+            execute(
+                f"ALTER INDEX {index_name} ATTACH PARTITION {partition_index}",
+                note=note,
+            )
+
+
+def drop_index_concurrently(index_name):
+    """Drop an index of an unpartitioned table without blocking writes."""
+    with op.get_context().autocommit_block():
+        execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+
+def add_column(table, column):
+    """
+    Add a column under a short lock timeout.
+
+    A constant default is stored in the catalog and does not rewrite the
+    table. A volatile default such as `now()` or `gen_random_uuid()` rewrites
+    it under an ACCESS EXCLUSIVE lock; add the column without a default,
+    set the default separately and `backfill` instead.
+
+    :param table: The table name
+    :param column: A `sqlalchemy.Column`
+    """
+    definition = CreateColumn(column).compile(dialect=op.get_context().dialect)
+    with op.get_context().autocommit_block():
+        execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {definition}")
+
+
+def add_not_null(table, column):
+    """
+    Make a column NOT NULL without holding an exclusive lock during the scan.
+
+    A NOT VALID check constraint is added instantly, validated while reads
+    and writes continue, and then lets SET NOT NULL skip its own scan.
+    """
+    constraint = _identifier(f"ck_{table}_{column}_not_null")
+    with op.get_context().autocommit_block():
+        execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+        execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+            f"CHECK ({column} IS NOT NULL) NOT VALID"
+        )
+        execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+        execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+        execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+
+
+def add_foreign_key(constraint, table, referenced, columns, referenced_columns):
+    """
+    Add a foreign key without blocking writes while existing rows are checked.
+    """
+    with op.get_context().autocommit_block():
+        execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+            f"FOREIGN KEY ({', '.join(columns)}) "
+            f"REFERENCES {referenced} ({', '.join(referenced_columns)}) NOT VALID"
+        )
+        execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+
+
+def replication_lag():
+    """
+    Return the replay lag of the slowest replica in seconds.
+
+    Needs the pg_monitor role to see other sessions' lag, without it the lag
+    reads as 0.
+    """
+    return float(op.get_bind().execute(REPLICATION_LAG).scalar() or 0)
+
+
+def wait_for_replicas(max_lag, poll_interval=1.0):
+    """Block while any replica is more than `max_lag` seconds behind."""
+    while True:
+        lag = replication_lag()
+        if lag <= max_lag:
+            return
+        logger.info("Replicas are %.1fs behind, pausing the backfill", lag)
+        time.sleep(poll_interval)
+
+
+def backfill(
+    sql,
+    batch_size=5000,
+    max_lag=5.0,
+    pause=0.0,
+    statement_timeout="30s",
+):
+    """
+    Run a batched UPDATE that walks the table in key order until it is done.
+
+    `sql` takes the `:batch_size` rows after `:last_id` in key order, updates
+    those that need it, and returns the last key it covered, or NULL past the
+    end of the table, e.g.
+
+        WITH batch AS (
+            SELECT id FROM t WHERE id > :last_id ORDER BY id LIMIT :batch_size
+        ), updated AS (
+            UPDATE t SET ... FROM batch WHERE t.id = batch.id AND t.c IS NULL
+        )
+        SELECT max(id) FROM batch
+
+    Each batch reads only its own rows, unlike `WHERE c IS NULL LIMIT n`,
+    which rescans every row the earlier batches filled in. Each batch
+    commits on its own, so row locks are short lived, and a re-run after an
+    interruption skips the rows already updated. Batches wait while replicas
+    lag more than `max_lag` seconds behind.
+
+    :param sql: The batch statement
+    :param batch_size: Rows per batch
+    :param max_lag: Replication lag in seconds above which batches pause
+    :param pause: Seconds to sleep between batches
+    :param statement_timeout: How long one batch may run
+    :return: The number of batches run
+    :rtype: int
+    """
+    batches = 0
+    with op.get_context().autocommit_block():
+        if is_offline():
+            execute(
+                sql,
+                statement_timeout=statement_timeout,
+                params={"last_id": 0, "batch_size": batch_size},
+                note="repeat with :last_id set to the result until it is NULL",
+            )
+            return batches
+        last_id = 0
+        while True:
+            wait_for_replicas(max_lag)
+            last_id = execute(
+                sql,
+                statement_timeout=statement_timeout,
+                params={"last_id": last_id, "batch_size": batch_size},
+                scalar=True,
+            )
+            if last_id is None:
+                return batches
+            batches += 1
+            logger.info("Backfilled up to %s (batch %d)", last_id, batches)
+            time.sleep(pause)
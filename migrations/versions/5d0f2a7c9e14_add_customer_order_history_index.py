@@ -0,0 +1,51 @@
+"""add customer order history index
+
+Revision ID: 5d0f2a7c9e14
+Revises: 4086f5ffb3a3
+Create Date: 2026-10-19 12:40:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_concurrently
+
+revision: str = "5d0f2a7c9e14"
+down_revision: Union[str, None] = "4086f5ffb3a3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        op.create_index(
+            "ix_orders_customer_id_order_date",
+            "orders",
+            ["customer_id", sa.text("order_date DESC"), sa.text("id DESC")],
+        )
+        op.create_index("ix_order_items_order_id", "order_items", ["order_id"])
+        return
+
+    # orders and order_items are partitioned, and a plain CREATE INDEX on
+    # the parent blocks writes to every partition until all are built, so
+    # each partition is indexed concurrently instead
+    create_index_concurrently(
+        "ix_orders_customer_id_order_date",
+        "orders",
+        ["customer_id", "order_date DESC", "id DESC"],
+        include=["status"],
+        partitioned=True,
+    )
+    create_index_concurrently(
+        "ix_order_items_order_id", "order_items", ["order_id"], partitioned=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_order_items_order_id", table_name="order_items")
+    op.drop_index("ix_orders_customer_id_order_date", table_name="orders")
@@ -0,0 +1,69 @@
+"""add order item price snapshot
+
+Revision ID: 7c3e91b0d2a4
+Revises: 5d0f2a7c9e14
+Create Date: 2026-10-19 14:05:00.000000
+
+Expand step: both columns are added as nullable and backfilled, and code
+that maps them tolerates NULL, so this can run before or after that code is
+deployed. Rows inserted by older code meanwhile are caught by e2b7d94c1f58,
+the contract step, which makes both columns NOT NULL.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_column, backfill
+
+revision: str = "7c3e91b0d2a4"
+down_revision: Union[str, None] = "5d0f2a7c9e14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Historic rows get the menu price at migration time, the best record we have
+BACKFILL_BATCH = """
+    WITH batch AS (
+        SELECT id, created_at
+        FROM order_items
+        WHERE id > :last_id
+        ORDER BY id
+        LIMIT :batch_size
+    ), updated AS (
+        UPDATE order_items AS oi
+        SET unit_price = mi.price,
+            line_total = oi.quantity * mi.price
+        FROM batch, menu_items AS mi
+        WHERE oi.id = batch.id
+          AND oi.created_at = batch.created_at
+          AND oi.unit_price IS NULL
+          AND mi.id = oi.menu_item_id
+    )
+    SELECT max(id) FROM batch
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        op.add_column("order_items", sa.Column("unit_price", sa.Float()))
+        op.add_column("order_items", sa.Column("line_total", sa.Float()))
+        op.execute(
+            "UPDATE order_items SET unit_price = (SELECT price FROM menu_items "
+            "WHERE menu_items.id = order_items.menu_item_id)"
+        )
+        op.execute("UPDATE order_items SET line_total = quantity * unit_price")
+        return
+
+    add_column("order_items", sa.Column("unit_price", sa.Float(), nullable=True))
+    add_column("order_items", sa.Column("line_total", sa.Float(), nullable=True))
+    backfill(BACKFILL_BATCH, batch_size=BACKFILL_BATCH_SIZE)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("order_items", "line_total")
+    op.drop_column("order_items", "unit_price")
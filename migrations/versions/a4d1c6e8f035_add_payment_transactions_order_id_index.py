@@ -0,0 +1,41 @@
+"""add payment transactions order id index
+
+Revision ID: a4d1c6e8f035
+Revises: 7c3e91b0d2a4
+Create Date: 2026-10-19 16:20:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_index_concurrently
+
+revision: str = "a4d1c6e8f035"
+down_revision: Union[str, None] = "7c3e91b0d2a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        op.create_index(
+            "ix_payment_transactions_order_id", "payment_transactions", ["order_id"]
+        )
+        return
+
+    # Partitioned since b9cd8531c1e6, so the index is built partition by
+    # partition without blocking checkout writes
+    create_index_concurrently(
+        "ix_payment_transactions_order_id",
+        "payment_transactions",
+        ["order_id"],
+        partitioned=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_payment_transactions_order_id", table_name="payment_transactions")
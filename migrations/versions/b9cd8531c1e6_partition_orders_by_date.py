@@ -0,0 +1,160 @@
+"""partition orders, order_items and payment_transactions by date
+
+Revision ID: b9cd8531c1e6
+Revises: 2543622b4e7c
+Create Date: 2026-10-19 09:30:00.000000
+
+Converts the three high volume tables to Postgres declarative range
+partitioning with one partition per month plus a default partition:
+
+- orders               PARTITION BY RANGE (order_date)
+- order_items          PARTITION BY RANGE (created_at)
+- payment_transactions PARTITION BY RANGE (payment_date)
+
+A primary key on a partitioned table must include the partition key, so the
+primary keys become (id, <partition key>). `id` keeps its sequence and stays
+unique in practice, which is all the ORM relies on. Foreign keys *to* orders
+can no longer reference `orders.id` alone and are dropped; foreign keys to
+customers and menu_items are kept.
+
+Upcoming partitions are created by `python -m db.partitions ensure` and old
+ones archived by `python -m db.partitions archive`.
+
+This revision needs downtime: stop checkout before running it. Each table is
+renamed and copied into its partitioned replacement with one INSERT in the
+migration transaction, so orders, order_items and payment_transactions stay
+ACCESS EXCLUSIVE locked, for reads too, until every row has been copied.
+Time the upgrade on a restored copy of production to size the window.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "b9cd8531c1e6"
+down_revision: Union[str, None] = "2543622b4e7c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (partition key, foreign keys to keep as (column, referenced table))
+TABLES = {
+    "orders": ("order_date", [("customer_id", "customers")]),
+    "order_items": ("created_at", [("menu_item_id", "menu_items")]),
+    "payment_transactions": ("payment_date", []),
+}
+
+MONTHS_AHEAD = 2
+
+# Creates the monthly partitions from the oldest row of the legacy table (or
+# the current month) to MONTHS_AHEAD months ahead. It runs in the database,
+# so `alembic upgrade --sql` prints it like any other statement.
+CREATE_PARTITIONS = """
+DO $$
+DECLARE
+    month timestamp := date_trunc(
+        'month',
+        coalesce((SELECT min({key}) FROM {legacy}), now()) AT TIME ZONE 'UTC'
+    );
+    last timestamp := date_trunc('month', now() AT TIME ZONE 'UTC')
+        + interval '{months_ahead} months';
+BEGIN
+    WHILE month <= last LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF {table} FOR VALUES FROM (%L) TO (%L)',
+            '{table}_p' || to_char(month, 'YYYY_MM'),
+            month AT TIME ZONE 'UTC',
+            (month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        month := month + interval '1 month';
+    END LOOP;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    op.drop_constraint("order_items_order_id_fkey", "order_items", type_="foreignkey")
+    op.drop_constraint(
+        "payment_transactions_order_id_fkey",
+        "payment_transactions",
+        type_="foreignkey",
+    )
+
+    for table, (key, foreign_keys) in TABLES.items():
+        legacy = f"{table}_legacy"
+        op.rename_table(table, legacy)
+        op.execute(
+            f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"
+        )
+        for column, _ in foreign_keys:
+            op.execute(
+                f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_{column}_fkey "
+                f"TO {legacy}_{column}_fkey"
+            )
+
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE ({key})"
+        )
+        op.create_primary_key(f"{table}_pkey", table, ["id", key])
+        for column, referenced in foreign_keys:
+            op.create_foreign_key(
+                f"{table}_{column}_fkey", table, referenced, [column], ["id"]
+            )
+
+        op.execute(
+            CREATE_PARTITIONS.format(
+                table=table, key=key, legacy=legacy, months_ahead=MONTHS_AHEAD
+            )
+        )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.drop_table(legacy)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+
+    for table, (key, foreign_keys) in TABLES.items():
+        partitioned = f"{table}_partitioned"
+        op.rename_table(table, partitioned)
+        op.execute(
+            f"ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey"
+        )
+        for column, _ in foreign_keys:
+            op.execute(
+                f"ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_{column}_fkey "
+                f"TO {partitioned}_{column}_fkey"
+            )
+
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        op.create_primary_key(f"{table}_pkey", table, ["id"])
+        for column, referenced in foreign_keys:
+            op.create_foreign_key(
+                f"{table}_{column}_fkey", table, referenced, [column], ["id"]
+            )
+        op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
+
+    op.create_foreign_key(
+        "order_items_order_id_fkey", "order_items", "orders", ["order_id"], ["id"]
+    )
+    op.create_foreign_key(
+        "payment_transactions_order_id_fkey",
+        "payment_transactions",
+        "orders",
+        ["order_id"],
+        ["id"],
+    )
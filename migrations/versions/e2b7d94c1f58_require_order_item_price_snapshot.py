@@ -0,0 +1,72 @@
+"""require order item price snapshot
+
+Revision ID: e2b7d94c1f58
+Revises: a4d1c6e8f035
+Create Date: 2026-10-19 18:30:00.000000
+
+Contract step of 7c3e91b0d2a4. Run it once no code older than the price
+snapshot is running, so no new row is inserted without a price.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import add_not_null, backfill
+
+revision: str = "e2b7d94c1f58"
+down_revision: Union[str, None] = "a4d1c6e8f035"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Readiness accepts the database one revision below, see utils.health
+contract = True
+
+# Rows inserted by older code after 7c3e91b0d2a4 backfilled the table
+BACKFILL_BATCH = """
+    WITH batch AS (
+        SELECT id, created_at
+        FROM order_items
+        WHERE id > :last_id
+        ORDER BY id
+        LIMIT :batch_size
+    ), updated AS (
+        UPDATE order_items AS oi
+        SET unit_price = COALESCE(oi.unit_price, mi.price),
+            line_total = oi.quantity * COALESCE(oi.unit_price, mi.price)
+        FROM batch, menu_items AS mi
+        WHERE oi.id = batch.id
+          AND oi.created_at = batch.created_at
+          AND (oi.unit_price IS NULL OR oi.line_total IS NULL)
+          AND mi.id = oi.menu_item_id
+    )
+    SELECT max(id) FROM batch
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        with op.batch_alter_table("order_items") as batch_op:
+            batch_op.alter_column(
+                "unit_price", existing_type=sa.Float(), nullable=False
+            )
+            batch_op.alter_column(
+                "line_total", existing_type=sa.Float(), nullable=False
+            )
+        return
+
+    backfill(BACKFILL_BATCH, batch_size=10000)
+    add_not_null("order_items", "unit_price")
+    add_not_null("order_items", "line_total")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column(
+        "order_items", "line_total", existing_type=sa.Float(), nullable=True
+    )
+    op.alter_column(
+        "order_items", "unit_price", existing_type=sa.Float(), nullable=True
+    )
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("INVALIDATION_BUS_ENABLED", "false")
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("MENU_SNAPSHOT_DIR", str(tmp_path))
+
+    from db.models import Base
+    from main import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        Base.metadata.create_all(app.extensions["sqlalchemy"].engine)
+    yield app
+    with app.app_context():
+        app.extensions["sqlalchemy"].engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from utils.health import DatabaseProbe, probe_connect_args
+
+
+class SlowProbe(DatabaseProbe):
+    def __init__(self, delay):
+        super().__init__("sqlite://", ttl=0.0, timeout=1, expected_heads=frozenset())
+        self.delay = delay
+        self.checks = 0
+
+    def check(self):
+        self.checks += 1
+        time.sleep(self.delay)
+        return {"reachable": True, "check": self.checks}
+
+
+def test_callers_get_the_last_result_while_a_check_runs():
+    probe = SlowProbe(delay=0.0)
+    assert probe.result()["check"] == 1
+    probe.delay = 0.5
+
+    refresher = threading.Thread(target=probe.result)
+    refresher.start()
+    time.sleep(0.1)
+    started = time.perf_counter()
+    result = probe.result()
+    waited = time.perf_counter() - started
+    refresher.join()
+
+    assert result["check"] == 1
+    assert waited < 0.1
+    assert probe.result()["check"] == 3
+
+
+def test_postgres_probes_bound_connect_and_statement_time():
+    assert probe_connect_args("postgresql://db/app", 1.5) == {
+        "connect_timeout": 2,
+        "options": "-c statement_timeout=1500",
+    }
+    assert probe_connect_args("sqlite://", 1.5) == {}
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from db.models import MenuItem
+
+
+@pytest.fixture
+def menu_items(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        session.add_all(
+            [
+                MenuItem(name="Tea", description="Black tea", price=2.5),
+                MenuItem(name="Coffee", description="Filter coffee", price=3.0),
+            ]
+        )
+        session.commit()
+
+
+def prices(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        return dict(session.query(MenuItem.name, MenuItem.price))
+
+
+def test_patch_updates_the_item_matching_the_name(app, client, menu_items):
+    response = client.patch("/menu_item/tea", json={"price": 2.75})
+
+    assert response.status_code == 200
+    assert json.loads(response.data)["data"][0]["price"] == 2.75
+    assert prices(app) == {"Tea": 2.75, "Coffee": 3.0}
+
+
+def test_patch_refuses_a_name_matching_several_items(app, client, menu_items):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        session.add(MenuItem(name="TEA", description="Green tea", price=2.0))
+        session.commit()
+
+    response = client.patch("/menu_item/tea", json={"price": 9.0})
+
+    assert response.status_code == 409
+    assert json.loads(response.data)["data"] == []
+    assert prices(app) == {"Tea": 2.5, "TEA": 2.0, "Coffee": 3.0}
@@ -0,0 +1,93 @@
+import json
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from controllers.order import EXPAND_OPTIONS
+from db.models import Customer, MenuItem, Order, OrderItem, PaymentTransaction
+
+ITEMS_PER_ORDER = 5
+
+# Statements issued by GET /order/<id> for each `expand` value, whatever the
+# number of items or payments on the order
+EXPECTED_QUERIES = {
+    "": 1,
+    "items": 2,
+    "items.menu_item": 2,
+    "customer": 1,
+    "payments": 2,
+    "items.menu_item,customer,payments": 3,
+}
+
+
+@contextmanager
+def count_queries(app):
+    with app.app_context():
+        engine = app.extensions["sqlalchemy"].engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def order_id(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        customer = Customer(
+            name="Ada", phone_number="555-0100", email="ada@example.com"
+        )
+        order = Order(customer=customer, status="PENDING")
+        for number in range(ITEMS_PER_ORDER):
+            menu_item = MenuItem(
+                name=f"Dish {number}", description="House special", price=10.0 + number
+            )
+            order.order_items.append(
+                OrderItem(
+                    menu_item=menu_item,
+                    quantity=2,
+                    unit_price=menu_item.price,
+                    line_total=2 * menu_item.price,
+                )
+            )
+            order.payment_transactions.append(
+                PaymentTransaction(amount=5.0, payment_method="CASH")
+            )
+        session.add(order)
+        session.commit()
+        return order.id
+
+
+def test_every_expand_option_has_an_expected_query_count():
+    assert set(EXPAND_OPTIONS) <= set(EXPECTED_QUERIES)
+
+
+@pytest.mark.parametrize("expand", EXPECTED_QUERIES)
+def test_expand_query_count(app, client, order_id, expand):
+    with count_queries(app) as statements:
+        response = client.get(f"/order/{order_id}", query_string={"expand": expand})
+
+    assert response.status_code == 200
+    assert len(statements) == EXPECTED_QUERIES[expand], statements
+    detail = json.loads(response.data)["data"][0]
+    if "items" in expand:
+        assert len(detail["items"]) == ITEMS_PER_ORDER
+        assert ("menu_item" in detail["items"][0]) == ("menu_item" in expand)
+    else:
+        assert "items" not in detail
+    if "payments" in expand:
+        assert len(detail["payments"]) == ITEMS_PER_ORDER
+    assert ("customer" in detail) == ("customer" in expand)
+
+
+def test_unknown_expand_option_is_rejected(client, order_id):
+    response = client.get(f"/order/{order_id}", query_string={"expand": "everything"})
+
+    assert response.status_code == 400
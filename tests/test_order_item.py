@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from db.models import Customer, MenuItem, Order, OrderItem
+
+
+@pytest.fixture
+def order_item_id(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        order = Order(customer=Customer(name="Ada", phone_number="555-0100"))
+        menu_item = MenuItem(name="Tea", description="Black tea", price=2.5)
+        order_item = OrderItem(order=order, menu_item=menu_item, quantity=2)
+        session.add(order_item)
+        session.commit()
+        return order_item.id
+
+
+def test_patch_reprices_a_quantity_change(client, order_item_id):
+    response = client.patch(f"/order_item/{order_item_id}", json={"quantity": 3})
+
+    assert response.status_code == 200
+    detail = json.loads(response.data)["data"][0]
+    assert detail["quantity"] == 3
+    assert detail["line_total"] == 7.5
+
+
+@pytest.mark.parametrize("quantity", [0, -1, None])
+def test_patch_rejects_a_quantity_below_one(client, order_item_id, quantity):
+    response = client.patch(f"/order_item/{order_item_id}", json={"quantity": quantity})
+
+    assert response.status_code == 400
+
+
+def test_post_rejects_a_quantity_below_one(client, order_item_id):
+    response = client.post(
+        "/order_item/", json={"order_id": 1, "menu_item_id": 1, "quantity": 0}
+    )
+
+    assert response.status_code == 400
+
+
+def test_patch_moves_to_another_menu_item(app, client, order_item_id):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        menu_item = MenuItem(name="Coffee", description="Filter coffee", price=3.0)
+        session.add(menu_item)
+        session.commit()
+        menu_item_id = menu_item.id
+
+    response = client.patch(
+        f"/order_item/{order_item_id}", json={"menu_item_id": menu_item_id}
+    )
+
+    assert response.status_code == 200
+    detail = json.loads(response.data)["data"][0]
+    assert detail["unit_price"] == 3.0
+    assert detail["line_total"] == 6.0
+
+
+def test_patch_rejects_an_unknown_menu_item(client, order_item_id):
+    response = client.patch(f"/order_item/{order_item_id}", json={"menu_item_id": 99})
+
+    assert response.status_code == 404
+    assert response.get_json()["error"] == "Menu item not found"
+    detail = json.loads(client.get("/order_item/1").data)["data"][0]
+    assert detail["menu_item_id"] == 1
+    assert detail["line_total"] == 5.0
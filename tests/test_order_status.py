@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db.models import Customer, Order, OrderStatus
+
+
+@pytest.fixture
+def order_id(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        order = Order(
+            customer=Customer(name="Ada", phone_number="555-0100"),
+            status=OrderStatus.READY,
+        )
+        session.add(order)
+        session.commit()
+        return order.id
+
+
+def put_order(client, order_id, status):
+    return client.put(f"/order/{order_id}", json={"customer_id": 1, "status": status})
+
+
+def test_put_applies_an_allowed_status_change(client, order_id):
+    response = put_order(client, order_id, "PICKED_UP")
+
+    assert response.status_code == 200
+    assert json.loads(response.data)["data"][0]["status"] == "PICKED_UP"
+
+
+def test_put_keeps_the_current_status(client, order_id):
+    response = put_order(client, order_id, "READY")
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("status", ["PENDING", "CANCELLED"])
+def test_put_rejects_an_illegal_status_change(client, order_id, status):
+    response = put_order(client, order_id, status)
+
+    assert response.status_code == 409
+    assert (
+        response.get_json()["error"] == f"Illegal status transition READY -> {status}"
+    )
+    detail = json.loads(client.get(f"/order/{order_id}").data)["data"][0]
+    assert detail["status"] == "READY"
+
+
+def test_put_rejects_an_unknown_status(client, order_id):
+    response = put_order(client, order_id, "LOST")
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def old_order_id(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        order = Order(
+            customer=Customer(name="Grace", phone_number="555-0101"),
+            status=OrderStatus.READY,
+            order_date=datetime.now(timezone.utc) - timedelta(days=3),
+        )
+        session.add(order)
+        session.commit()
+        return order.id
+
+
+def bulk_pick_up(client, **options):
+    response = client.post(
+        "/order/status", json={"from_status": "READY", "status": "PICKED_UP", **options}
+    )
+    assert response.status_code == 200
+    return {detail["id"] for detail in json.loads(response.data)["data"]}
+
+
+def test_bulk_transition_includes_orders_outside_the_hot_window(
+    client, order_id, old_order_id
+):
+    assert bulk_pick_up(client) == {order_id, old_order_id}
+
+
+def test_bulk_transition_can_be_limited_to_the_hot_window(
+    client, order_id, old_order_id
+):
+    assert bulk_pick_up(client, hot_window_only=True) == {order_id}
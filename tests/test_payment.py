@@ -0,0 +1,57 @@
+import pytest
+
+from db.models import Customer, Order, OutboxEvent, PaymentTransaction
+
+
+@pytest.fixture
+def payment_id(app):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        payment = PaymentTransaction(
+            order=Order(customer=Customer(name="Ada", phone_number="555-0100")),
+            amount=12.5,
+            payment_method="CARD",
+            paid=False,
+        )
+        session.add(payment)
+        session.commit()
+        return payment.id
+
+
+def outbox_events(app, event_type):
+    with app.app_context():
+        session = app.extensions["sqlalchemy"].session
+        return [
+            (event.aggregate_id, event.payload)
+            for event in session.query(OutboxEvent).filter_by(event_type=event_type)
+        ]
+
+
+def test_patch_emits_payment_updated(app, client, payment_id):
+    response = client.patch(f"/payment/{payment_id}", json={"paid": True})
+
+    assert response.status_code == 200
+    [(aggregate_id, payload)] = outbox_events(app, "payment.updated")
+    assert aggregate_id == payment_id
+    assert payload["paid"] is True
+    assert payload["payment_method"] == "CARD"
+
+
+def test_put_emits_payment_updated(app, client, payment_id):
+    response = client.put(
+        f"/payment/{payment_id}",
+        json={"order_id": 1, "amount": 20.0, "payment_method": "UPI", "paid": True},
+    )
+
+    assert response.status_code == 200
+    [(aggregate_id, payload)] = outbox_events(app, "payment.updated")
+    assert aggregate_id == payment_id
+    assert payload["amount"] == 20.0
+    assert payload["paid"] is True
+
+
+def test_failed_patch_emits_nothing(app, client, payment_id):
+    response = client.patch("/payment/999", json={"paid": True})
+
+    assert response.status_code == 404
+    assert outbox_events(app, "payment.updated") == []
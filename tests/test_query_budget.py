@@ -0,0 +1,44 @@
+import pytest
+
+from db.query_budget import resolve_budget
+
+
+@pytest.mark.parametrize(
+    "endpoint",
+    [
+        "payment.add_payment_status",
+        "payment.update_payment_status",
+        "payment.patch_payment",
+    ],
+)
+def test_checkout_writes_get_more_time_than_the_default(app, endpoint):
+    budget = resolve_budget(app, endpoint, "payment")
+
+    assert budget.statement_timeout_ms > app.config["QUERY_STATEMENT_TIMEOUT_MS"]
+
+
+@pytest.mark.parametrize(
+    "endpoint",
+    [
+        "customer.get_customers",
+        "customer.get_customer_orders",
+        "order.get_order_detail",
+        "order.get_order_details_batch",
+        "menu_item.get_menu_items",
+    ],
+)
+def test_expensive_reads_get_tight_budgets(app, endpoint):
+    budget = resolve_budget(app, endpoint, endpoint.split(".")[0])
+
+    assert budget.statement_timeout_ms <= 2000
+
+
+def test_query_budgets_setting_overrides_a_declared_budget(app):
+    app.config["QUERY_BUDGETS"]["order.get_order_detail"] = {
+        "statement_timeout_ms": 5000
+    }
+
+    budget = resolve_budget(app, "order.get_order_detail", "order")
+
+    assert budget.statement_timeout_ms == 5000
+    assert budget.max_queries == 10
@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+
+import pytest
+
+
+class CountingStream(io.BytesIO):
+    """A request body that records how many bytes were read from it."""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.fixture
+def request_records(app, caplog):
+    caplog.set_level(logging.WARNING, logger=app.logger.name)
+    yield lambda: [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.name == app.logger.name and record.getMessage().startswith("{")
+    ]
+
+
+def send(client, path, size):
+    stream = CountingStream(b"x" * size)
+    response = client.put(
+        path,
+        input_stream=stream,
+        content_length=size,
+        content_type="application/json",
+    )
+    return response, stream
+
+
+def test_log_leaves_an_oversized_unread_body_unread(app, client, request_records):
+    size = app.config["REQUEST_MAX_BODY_BYTES"] * 4
+    response, stream = send(client, "/order/999", size)
+
+    assert response.status_code == 404
+    assert stream.bytes_read == 0
+    [record] = request_records()
+    assert record["body_size"] == size
+    assert record["body"] == ""
+    assert record["body_truncated"]
+
+
+def test_log_includes_the_start_of_an_unread_body(app, client, request_records):
+    size = app.config["LOG_BODY_MAX_BYTES"] * 2
+    response, stream = send(client, "/order/999", size)
+
+    assert response.status_code == 404
+    [record] = request_records()
+    assert record["body_size"] == size
+    assert record["body"] == "x" * app.config["LOG_BODY_MAX_BYTES"]
+    assert record["body_truncated"]
@@ -0,0 +1,27 @@
+import sqlite3
+
+from db.seed import seed
+
+
+def dump(path):
+    with sqlite3.connect(path) as connection:
+        return [line for line in connection.iterdump() if line.startswith("INSERT")]
+
+
+def test_seed_is_reproducible_across_workers(tmp_path):
+    paths = []
+    for workers in (1, 3):
+        path = tmp_path / f"seed-{workers}.db"
+        seed(
+            f"sqlite:///{path}",
+            orders=300,
+            customers=30,
+            workers=workers,
+            chunk_size=70,
+            create_schema=True,
+        )
+        paths.append(path)
+
+    first, second = (dump(path) for path in paths)
+    assert len(first) > 300
+    assert first == second
@@ -0,0 +1,74 @@
+import json
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from db.models import Base, MenuItem
+from db.shards import SHARD_BIND_PREFIX, get_shard_router
+
+OUTLETS = ("blr-01", "blr-02")
+
+
+@pytest.fixture(autouse=True)
+def shard_map(tmp_path, monkeypatch):
+    monkeypatch.setenv(
+        "SHARD_MAP",
+        json.dumps(
+            {outlet: f"sqlite:///{tmp_path / f'{outlet}.db'}" for outlet in OUTLETS}
+        ),
+    )
+
+
+@pytest.fixture
+def router(app):
+    with app.app_context():
+        db = app.extensions["sqlalchemy"]
+        for outlet in OUTLETS:
+            Base.metadata.create_all(db.engines[f"{SHARD_BIND_PREFIX}{outlet}"])
+        router = get_shard_router()
+        for outlet in OUTLETS:
+            session = router.session(outlet)
+            session.add(MenuItem(name=f"Tea {outlet}", description="Tea", price=2.5))
+            session.commit()
+        router.remove()
+        yield router
+
+
+def menu_names(session, outlet):
+    return session.scalars(select(MenuItem.name)).all()
+
+
+def test_fan_out_queries_every_shard_in_parallel(router):
+    # Both queries have to be running at once to get past the barrier
+    barrier = threading.Barrier(len(OUTLETS), timeout=5)
+
+    def query(session, outlet):
+        barrier.wait()
+        return menu_names(session, outlet)
+
+    results = router.fan_out(query)
+
+    assert results == {outlet: [f"Tea {outlet}"] for outlet in OUTLETS}
+
+
+def query_failing_on(failing_outlet):
+    def query(session, outlet):
+        if outlet == failing_outlet:
+            raise ValueError(f"{outlet} is down")
+        return menu_names(session, outlet)
+
+    return query
+
+
+def test_fan_out_returns_a_failing_shards_exception(router):
+    results = router.fan_out(query_failing_on("blr-02"), return_exceptions=True)
+
+    assert results["blr-01"] == ["Tea blr-01"]
+    assert isinstance(results["blr-02"], ValueError)
+    assert str(results["blr-02"]) == "blr-02 is down"
+
+
+def test_fan_out_raises_a_failing_shards_exception(router):
+    with pytest.raises(ValueError, match="blr-02 is down"):
+        router.fan_out(query_failing_on("blr-02"))
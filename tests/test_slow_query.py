@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from db.slow_query import SlowQueryLog, locks_rows, normalize_statement
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "SELECT * FROM orders WHERE id = %(id)s FOR UPDATE",
+        "select id from orders where status = 'pending' for update skip locked",
+        "SELECT * FROM orders FOR NO KEY UPDATE NOWAIT",
+        "SELECT * FROM orders FOR SHARE",
+        "SELECT * FROM orders\nFOR KEY SHARE",
+    ],
+)
+def test_locking_selects_are_detected(statement):
+    assert locks_rows(normalize_statement(statement))
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "SELECT * FROM orders WHERE id = %(id)s",
+        "SELECT * FROM orders WHERE note = 'for update'",
+        "SELECT * FROM orders WHERE format = 1",
+    ],
+)
+def test_plain_selects_are_not_locking(statement):
+    assert not locks_rows(normalize_statement(statement))
+
+
+@pytest.mark.parametrize(
+    "statement, analyze",
+    [
+        ("SELECT * FROM orders WHERE id = %(id)s", True),
+        ("SELECT * FROM orders WHERE id = %(id)s FOR UPDATE SKIP LOCKED", False),
+    ],
+)
+def test_locking_selects_are_explained_without_analyze(monkeypatch, statement, analyze):
+    slow_query_log = SlowQueryLog(0, explain=True)
+    explained = threading.Event()
+    calls = []
+
+    def explain_plan(engine, statement, parameters, analyze=True):
+        calls.append(analyze)
+        explained.set()
+        return {"Plan": {}}
+
+    monkeypatch.setattr(slow_query_log, "explain_plan", explain_plan)
+    normalized = normalize_statement(statement)
+    slow_query_log.request_plan(None, statement, {"id": 1}, normalized, {})
+
+    assert explained.wait(timeout=5)
+    assert calls == [analyze]
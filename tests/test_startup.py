@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.startup import DEFERRED_MODULES, TOLERANCE, load_baseline, measure
+
+
+@pytest.fixture(scope="module")
+def startup():
+    return measure(runs=5)
+
+
+@pytest.mark.startup
+def test_create_app_stays_within_the_baseline(startup):
+    allowed = load_baseline() * (1 + TOLERANCE)
+    slowest = sorted(
+        startup["last"]["importtime"].items(),
+        key=lambda item: item[1][1],
+        reverse=True,
+    )[:5]
+
+    assert startup["ratio"] <= allowed, (
+        f"import main {startup['import_ms']:.0f} ms + create_app() "
+        f"{startup['create_ms']:.0f} ms is {startup['ratio']:.3f} x the "
+        f"{startup['dependencies_ms']:.0f} ms dependency import, over {allowed:.3f}; "
+        f"slowest imports (cumulative us): {slowest}"
+    )
+
+
+@pytest.mark.parametrize("module", DEFERRED_MODULES)
+def test_module_is_not_imported_at_startup(module):
+    assert module not in measure(runs=1)["last"]["modules"]
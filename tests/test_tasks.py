@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from utils.tasks import TaskExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_tasks_run_inline_once_the_app_is_testing(app):
+    ran_on = []
+
+    app.extensions["tasks"].submit(
+        "record", lambda: ran_on.append(threading.current_thread())
+    )
+
+    assert ran_on == [threading.current_thread()]
+
+
+def test_task_eager_setting_overrides_testing(app):
+    app.config["TASK_EAGER"] = False
+    done = threading.Event()
+
+    assert app.extensions["tasks"].submit("record", done.set)
+    assert done.wait(5)
+    assert not app.extensions["tasks"].eager
+
+
+@pytest.fixture
+def executor(app):
+    app.config["TASK_EAGER"] = False
+    executor = TaskExecutor(app, max_workers=1, max_queue=1, submit_timeout=0.01)
+    release = threading.Event()
+    yield executor, release
+    release.set()
+
+
+def block_worker(executor, release):
+    started = threading.Event()
+
+    def hang():
+        started.set()
+        release.wait(5)
+
+    assert executor.submit("hang", hang)
+    assert started.wait(5)
+
+
+def test_submit_rejects_tasks_once_the_queue_is_full(executor):
+    executor, release = executor
+    block_worker(executor, release)
+
+    assert executor.submit("queued", lambda: None)
+    assert not executor.submit("overflow", lambda: None)
+    assert executor.stats()["tasks"]["overflow"]["rejected"] == 1
+
+
+def test_shutdown_abandons_tasks_left_after_the_timeout(executor):
+    executor, release = executor
+    block_worker(executor, release)
+    ran = threading.Event()
+    executor.submit("queued", ran.set)
+
+    started = time.monotonic()
+    assert executor.shutdown(timeout=0.1) == 2
+    assert time.monotonic() - started < 1
+    assert not executor.submit("late", ran.set)
+
+    release.set()
+    assert not ran.wait(0.2)
+
+
+def test_hung_task_does_not_block_process_exit():
+    script = (
+        "import threading\n"
+        "from flask import Flask\n"
+        "from utils.tasks import configure_tasks\n"
+        "app = Flask('exit')\n"
+        "configure_tasks(app)\n"
+        "app.extensions['tasks'].submit('hang', threading.Event().wait)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        env={**os.environ, "TASK_SHUTDOWN_TIMEOUT": "0.2"},
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert "Abandoned 1 background tasks on shutdown" in result.stderr
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from db.shards import current_outlet
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Readers take a `generation()` token before querying the database and pass
+    it back to `set`. Any invalidation in between bumps the generation and the
+    stale value is dropped instead of being cached.
+    """
+
+    def __init__(self, maxsize, ttl, enabled=True, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled and maxsize > 0 and ttl > 0
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def generation(self):
+        """Return a token to pass to `set` for the value about to be computed."""
+        return self._generation
+
+    def get(self, key):
+        """Return the cached value for `key`, or MISSING."""
+        if not self.enabled:
+            return MISSING
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        """Cache `value` unless the cache was invalidated since `generation`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Drop the entries for `keys`."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Return the cache's size and hit/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+DISABLED_CACHE = LRUCache(maxsize=0, ttl=0, enabled=False)
+
+
+def configure_caches(app):
+    """Create the application's in-process caches."""
+    app.config["ORDER_ITEM_CACHE_ENABLED"] = (
+        os.getenv("ORDER_ITEM_CACHE_ENABLED", "true").lower() == "true"
+    )
+    app.config["ORDER_ITEM_CACHE_SIZE"] = int(
+        os.getenv("ORDER_ITEM_CACHE_SIZE", "1024")
+    )
+    app.config["ORDER_ITEM_CACHE_TTL"] = float(os.getenv("ORDER_ITEM_CACHE_TTL", "30"))
+
+    app.extensions["caches"] = {
+        "order_items": LRUCache(
+            maxsize=app.config["ORDER_ITEM_CACHE_SIZE"],
+            ttl=app.config["ORDER_ITEM_CACHE_TTL"],
+            enabled=app.config["ORDER_ITEM_CACHE_ENABLED"],
+        ),
+    }
+
+
+def get_cache(name):
+    """
+    Return the named cache of the current app.
+
+    Caching is switched off while the app is in testing mode so tests always
+    observe the database.
+    """
+    if current_app.testing:
+        return DISABLED_CACHE
+    return current_app.extensions["caches"][name]
+
+
+def outlet_key(key):
+    """
+    Namespace a cache key by the request's outlet.
+
+    Outlets live in different databases, so their ids overlap.
+    """
+    return (current_outlet(), key)
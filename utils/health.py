@@ -0,0 +1,165 @@
+import math
+import os
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.pool import QueuePool
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+
+
+@lru_cache(maxsize=None)
+def migration_heads(migrations_dir=MIGRATIONS_DIR):
+    """
+    Return the alembic revisions this code can run against.
+
+    These are the heads, plus the revisions below a head that only contract
+    steps (revisions with `contract = True`) separate from it. A contract
+    step runs after the code is rolled out, so the code must be ready before
+    it is applied.
+
+    Loading alembic and every revision file is slow, so it waits for the
+    first readiness check instead of slowing down worker start.
+    """
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory(migrations_dir)
+    revisions = set()
+    for head in script.get_heads():
+        revision = script.get_revision(head)
+        revisions.add(revision.revision)
+        while getattr(revision.module, "contract", False) and revision.down_revision:
+            revision = script.get_revision(revision.down_revision)
+            revisions.add(revision.revision)
+    return frozenset(revisions)
+
+
+def probe_connect_args(database_uri, timeout):
+    """
+    Return DBAPI arguments that bound connecting and every statement by `timeout`.
+
+    Without them a probe against a host that drops packets waits for the
+    operating system's TCP timeout, minutes rather than seconds.
+    """
+    if make_url(database_uri).get_backend_name() != "postgresql":
+        return {}
+    return {
+        # libpq takes whole seconds
+        "connect_timeout": max(1, math.ceil(timeout)),
+        "options": f"-c statement_timeout={int(timeout * 1000)}",
+    }
+
+
+def pool_usage(engine):
+    """
+    Describe how much of an engine's connection pool is checked out.
+
+    :return: The pool counters, or None for pools that do not track them
+    :rtype: dict
+    """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checked_out": checked_out,
+        "overflow": pool.overflow(),
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+    }
+
+
+class DatabaseProbe:
+    """
+    Check that a database answers and is migrated to the code's head.
+
+    The probe owns a one-connection engine, so readiness checks never wait
+    for, or hold, a connection from the request pool, and connecting and each
+    statement are bounded by `timeout`. Results are cached for `ttl` seconds.
+    Once a result is stale one caller re-checks while concurrent callers get
+    the last result instead of queueing behind it.
+    """
+
+    def __init__(self, database_uri, ttl, timeout, expected_heads=None):
+        self.ttl = ttl
+        self.expected_heads = expected_heads
+        self.engine = create_engine(
+            database_uri,
+            poolclass=QueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=timeout,
+            pool_pre_ping=True,
+            connect_args=probe_connect_args(database_uri, timeout),
+        )
+        self._lock = threading.Lock()
+        # (result, checked at), replaced as a whole so readers need no lock
+        self._cached = None
+
+    def check(self):
+        started = time.perf_counter()
+        result = {"reachable": False, "migration_heads": [], "at_head": False}
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                result["reachable"] = True
+                heads = set(
+                    connection.execute(
+                        text("SELECT version_num FROM alembic_version")
+                    ).scalars()
+                )
+            result["migration_heads"] = sorted(heads)
+            expected_heads = self.expected_heads
+            if expected_heads is None:
+                expected_heads = migration_heads()
+            result["at_head"] = bool(heads) and heads <= expected_heads
+        except Exception as e:
+            result["error"] = str(e).splitlines()[0]
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def _stale(self):
+        return self._cached is None or time.monotonic() - self._cached[1] >= self.ttl
+
+    def result(self):
+        """
+        Return the cached probe result, re-checking once it is older than the TTL.
+
+        Only the very first call waits for a check that another caller is
+        running; later ones return the previous result meanwhile.
+        """
+        if self._stale() and self._lock.acquire(blocking=self._cached is None):
+            try:
+                if self._stale():
+                    self._cached = (self.check(), time.monotonic())
+            finally:
+                self._lock.release()
+        result, checked_at = self._cached
+        return dict(result, age_s=round(time.monotonic() - checked_at, 3))
+
+
+def configure_health(app):
+    """Create a readiness probe for the default database and every outlet."""
+    app.config["HEALTH_PROBE_TTL"] = float(os.getenv("HEALTH_PROBE_TTL", "5"))
+    app.config["HEALTH_PROBE_TIMEOUT"] = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+    app.config["HEALTH_POOL_SATURATION_LIMIT"] = float(
+        os.getenv("HEALTH_POOL_SATURATION_LIMIT", "1.0")
+    )
+    app.config["HEALTH_REQUIRE_MIGRATION_HEAD"] = (
+        os.getenv("HEALTH_REQUIRE_MIGRATION_HEAD", "true").lower() == "true"
+    )
+
+    databases = {None: app.config["SQLALCHEMY_DATABASE_URI"]}
+    databases.update(app.config.get("SHARD_MAP", {}))
+    app.extensions["health"] = {
+        outlet: DatabaseProbe(
+            database_uri,
+            ttl=app.config["HEALTH_PROBE_TTL"],
+            timeout=app.config["HEALTH_PROBE_TIMEOUT"],
+        )
+        for outlet, database_uri in databases.items()
+    }
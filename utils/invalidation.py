@@ -0,0 +1,203 @@
+import atexit
+import logging
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+
+def notify_invalidation(session, entity, *keys):
+    """
+    Tell every worker to evict cached `entity` entries once this transaction commits.
+
+    Sends one compact `entity|key|version` NOTIFY per key, where version is
+    the writer's clock in milliseconds. Keys are the cache keys, e.g. the
+    order id for "order_items". Postgres only delivers notifications
+    on commit and drops them on rollback. Other databases have no bus and
+    this is a no-op.
+    """
+    if not current_app.config["INVALIDATION_BUS_ENABLED"]:
+        return
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    version = time.time_ns() // 1_000_000
+    for key in dict.fromkeys(keys):
+        session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {
+                "channel": current_app.config["INVALIDATION_CHANNEL"],
+                "payload": f"{entity}|{key}|{version}",
+            },
+        )
+
+
+def parse_message(payload):
+    """
+    Split a NOTIFY payload into (entity, key, version).
+
+    :raises ValueError: If the payload is malformed
+    """
+    entity, key, version = payload.split("|")
+    return entity, key, int(version)
+
+
+class InvalidationBus:
+    """
+    Evicts cache entries when any worker, on any host, writes an entity.
+
+    Each worker process runs one listener thread per database, on a dedicated
+    connection outside the request pool. Notifications sent while a
+    listener is disconnected are lost, so after every reconnect the bus calls
+    the flush handlers for that database.
+    """
+
+    def __init__(self, databases, channel, reconnect_delay):
+        self.databases = databases
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._handlers = defaultdict(list)
+        self._flush_handlers = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def on(self, entity, handler):
+        """Call `handler(outlet, key, received_at)` for every message about `entity`."""
+        self._handlers[entity].append(handler)
+
+    def on_flush(self, handler):
+        """Call `handler(outlet)` when an outlet's messages may have been missed."""
+        self._flush_handlers.append(handler)
+
+    def dispatch(self, outlet, payload, received_at):
+        try:
+            entity, key, _ = parse_message(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation message %r", payload)
+            return
+        for handler in self._handlers.get(entity, ()):
+            try:
+                handler(outlet, key, received_at)
+            except Exception:
+                logger.exception("Invalidation handler failed for %s", payload)
+
+    def flush(self, outlet):
+        for handler in self._flush_handlers:
+            try:
+                handler(outlet)
+            except Exception:
+                logger.exception("Flush handler failed for outlet %s", outlet)
+
+    def ensure_started(self):
+        """Start the listeners in this process. Cheap to call on every request."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked worker inherits the flag but not the parent's threads
+            self._pid = os.getpid()
+            self._stopped.clear()
+            for outlet, database_uri in self.databases.items():
+                threading.Thread(
+                    target=self._listen,
+                    args=(outlet, database_uri),
+                    name=f"invalidation-{outlet or 'default'}",
+                    daemon=True,
+                ).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self, outlet, database_uri):
+        engine = create_engine(database_uri, poolclass=NullPool)
+        connected_before = False
+        while not self._stopped.is_set():
+            try:
+                connection = engine.raw_connection()
+            except Exception as e:
+                logger.warning("Invalidation listener cannot connect: %s", e)
+                self._stopped.wait(self.reconnect_delay)
+                continue
+            try:
+                dbapi_connection = connection.driver_connection
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f'LISTEN "{self.channel}"')
+                if connected_before:
+                    self.flush(outlet)
+                connected_before = True
+                while not self._stopped.is_set():
+                    if not select.select([dbapi_connection], [], [], 1.0)[0]:
+                        continue
+                    dbapi_connection.poll()
+                    received_at = time.time()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        self.dispatch(outlet, notification.payload, received_at)
+            except Exception as e:
+                logger.warning("Invalidation listener disconnected: %s", e)
+                self._stopped.wait(self.reconnect_delay)
+            finally:
+                connection.invalidate()
+        engine.dispose()
+
+
+def configure_invalidation(app):
+    """Evict the app's caches on writes made by other workers."""
+    app.config["INVALIDATION_BUS_ENABLED"] = (
+        os.getenv("INVALIDATION_BUS_ENABLED", "true").lower() == "true"
+    )
+    app.config["INVALIDATION_CHANNEL"] = os.getenv(
+        "INVALIDATION_CHANNEL", "cache_invalidation"
+    )
+    app.config["INVALIDATION_RECONNECT_DELAY"] = float(
+        os.getenv("INVALIDATION_RECONNECT_DELAY", "1")
+    )
+
+    databases = {None: app.config["SQLALCHEMY_DATABASE_URI"]}
+    databases.update(app.config.get("SHARD_MAP", {}))
+    databases = {
+        outlet: database_uri
+        for outlet, database_uri in databases.items()
+        if database_uri.startswith("postgresql")
+    }
+    if not app.config["INVALIDATION_BUS_ENABLED"] or not databases:
+        return
+
+    bus = InvalidationBus(
+        databases,
+        channel=app.config["INVALIDATION_CHANNEL"],
+        reconnect_delay=app.config["INVALIDATION_RECONNECT_DELAY"],
+    )
+    app.extensions["invalidation"] = bus
+
+    order_items = app.extensions["caches"]["order_items"]
+    bus.on(
+        "order_items",
+        lambda outlet, key, received_at: order_items.invalidate((outlet, int(key))),
+    )
+    bus.on_flush(lambda outlet: order_items.clear())
+
+    menu_snapshots = app.extensions["snapshots"].get("menu", {})
+    if menu_snapshots:
+        bus.on(
+            "menu_items",
+            lambda outlet, key, received_at: menu_snapshots[outlet].invalidate(
+                built_before=received_at
+            ),
+        )
+        bus.on_flush(lambda outlet: menu_snapshots[outlet].invalidate())
+
+    atexit.register(bus.stop)
+
+    @app.before_request
+    def start_invalidation_listener():
+        bus.ensure_started()
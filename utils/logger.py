@@ -1,15 +1,62 @@
 from flask import g, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+import json
+import logging
+import logging.config
 import os
+import random
 import time
-from datetime import datetime
+from datetime import datetime, timezone
+from utils.tracing import span
+
+
+class LazyJson:
+    """
+    A log argument that is only rendered to JSON if a handler emits it.
+
+    Building the record is deferred to `value()`, so requests whose log level
+    is disabled never pay for reading headers or formatting the body.
+    """
+
+    __slots__ = ("build", "_value")
+
+    def __init__(self, build):
+        self.build = build
+        self._value = None
+
+    def value(self):
+        if self._value is None:
+            self._value = self.build()
+        return self._value
+
+    def __str__(self):
+        return json.dumps(self.value(), default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format every log record as a single JSON object."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "module": record.module,
+        }
+        if len(record.args or ()) == 1 and isinstance(record.args[0], LazyJson):
+            entry.update(record.args[0].value())
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
 
 def configure_logging():
     """Configure logging for the application."""
     # Create logs folder if not present
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
+    os.makedirs("logs", exist_ok=True)
 
+    formatter = "json" if os.getenv("LOG_FORMAT", "text") == "json" else "default"
     return {
         "version": 1,
         "formatters": {
@@ -17,18 +64,21 @@ def configure_logging():
                 "format": "[%(asctime)s] | [%(levelname)s] | [%(module)s] | [%(message)s]",
                 "datefmt": "%B %d, %Y %H:%M:%S %Z",
             },
+            "json": {
+                "()": JsonFormatter,
+            },
         },
         "handlers": {
             "console": {
                 "class": "logging.StreamHandler",
-                "formatter": "default",
+                "formatter": formatter,
             },
             "file": {
                 "class": "logging.handlers.TimedRotatingFileHandler",
                 "filename": "logs/app.log",
                 "when": "midnight",
                 "backupCount": 5,
-                "formatter": "default",
+                "formatter": formatter,
             },
         },
         "root": {
@@ -38,32 +88,135 @@ def configure_logging():
     }
 
 
+_logging_configured = False
+
+
+def setup_logging():
+    """
+    Apply `configure_logging()` once per process.
+
+    Later apps, such as one per test, keep the existing handlers instead of
+    closing and reopening the log file.
+    """
+    global _logging_configured
+    if _logging_configured:
+        return
+    logging.config.dictConfig(configure_logging())
+    _logging_configured = True
+
+
+def sample_rate(app, endpoint, status):
+    """
+    Return the fraction of requests to log for an endpoint and status code.
+
+    `LOG_SAMPLE_RATES` keys are tried from most to least specific:
+    "endpoint:200", "endpoint:2xx", "endpoint", "200", "2xx".
+    """
+    rates = app.config["LOG_SAMPLE_RATES"]
+    status_class = f"{status // 100}xx"
+    for key in (
+        f"{endpoint}:{status}",
+        f"{endpoint}:{status_class}",
+        endpoint,
+        str(status),
+        status_class,
+    ):
+        if key in rates:
+            return rates[key]
+    return app.config["LOG_SAMPLE_RATE"]
+
+
+def request_log_record(app, response, duration_ms, full):
+    """
+    Build the structured log record for the current request.
+
+    Headers are limited to `LOG_HEADER_ALLOWLIST` and the body is cut at
+    `LOG_BODY_MAX_BYTES`. Both are only included in full records. A body the
+    view never read is read here under the request's body size limit, and
+    one over the limit is left unread.
+    """
+    record = {
+        "event": "request",
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "duration_ms": round(duration_ms, 2),
+        "response_size": response.content_length,
+    }
+    if "query_count" in g:
+        record["queries"] = g.query_count
+    if full:
+        allowlist = app.config["LOG_HEADER_ALLOWLIST"]
+        record["headers"] = {
+            name: value for name, value in request.headers if name.lower() in allowlist
+        }
+        body_cap = app.config["LOG_BODY_MAX_BYTES"]
+        body = b""
+        # An oversized body was refused unread and must not be read here either
+        if response.status_code != 413:
+            try:
+                body = request.get_data(cache=True)
+            except RequestEntityTooLarge:
+                pass
+        body_size = max(len(body), request.content_length or 0)
+        record["body_size"] = body_size
+        record["body"] = body[:body_cap].decode("utf-8", errors="replace")
+        record["body_truncated"] = body_size > len(body[:body_cap])
+    return record
+
+
 def configure_request_handler(app):
     """
     Configure request handler for the application.
     """
+    app.config["LOG_SAMPLE_RATE"] = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+    # Orchestrator probes are only logged when they fail
+    app.config["LOG_SAMPLE_RATES"] = {
+        "health.liveness": 0.0,
+        "health.readiness": 0.0,
+        **json.loads(os.getenv("LOG_SAMPLE_RATES", "{}")),
+    }
+    app.config["LOG_BODY_MAX_BYTES"] = int(os.getenv("LOG_BODY_MAX_BYTES", "1024"))
+    app.config["LOG_HEADER_ALLOWLIST"] = {
+        name.strip().lower()
+        for name in os.getenv(
+            "LOG_HEADER_ALLOWLIST",
+            "Content-Type,Content-Length,User-Agent,X-Request-Id",
+        ).split(",")
+    }
+    app.config["LOG_SLOW_REQUEST_MS"] = float(os.getenv("LOG_SLOW_REQUEST_MS", "500"))
 
     @app.before_request
     def log_request_info():
         g.logger = app.logger
-        request.start_time = time.time()
-        app.logger.info("Headers: %s", request.headers)
-        app.logger.info("Body: %s", request.get_data())
+        request.start_time = time.perf_counter()
 
     @app.after_request
     def logAfterRequest(response):
         """Log the response."""
-        app.logger.info(
-            "path: %s | method: %s | status: %s | size: %s",
-            request.path,
-            request.method,
-            response.status,
-            response.content_length,
-        )
-        request.end_time = time.time()
-        total_time = request.end_time - request.start_time
-        app.logger.info(f"Total request time: {total_time:.2f} seconds")
+        # An earlier before_request handler may have answered before the timer started
+        start_time = getattr(request, "start_time", None) or time.perf_counter()
+        duration_ms = (time.perf_counter() - start_time) * 1000
+        status = response.status_code
+        # Errors and slow requests are always logged in full
+        full = status >= 400 or duration_ms >= app.config["LOG_SLOW_REQUEST_MS"]
+        if full:
+            level = logging.ERROR if status >= 500 else logging.WARNING
+        else:
+            level = logging.INFO
+            if random.random() >= sample_rate(app, request.endpoint, status):
+                return response
 
+        if app.logger.isEnabledFor(level):
+            with span("logging"):
+                app.logger.log(
+                    level,
+                    "%s",
+                    LazyJson(
+                        lambda: request_log_record(app, response, duration_ms, full)
+                    ),
+                )
         return response
 
     @app.errorhandler(Exception)
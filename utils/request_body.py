@@ -0,0 +1,125 @@
+import json
+import os
+
+from flask import current_app, jsonify, request
+from pydantic import ConfigDict, Field, ValidationError
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from utils.tracing import TracedModel
+
+
+class RequestBodyError(Exception):
+    """A request body that cannot be accepted, answered with `status`."""
+
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def max_body_size(limit):
+    """Override `REQUEST_MAX_BODY_BYTES` for one view."""
+
+    def decorate(view):
+        view.max_body_bytes = limit
+        return view
+
+    return decorate
+
+
+def body_limit():
+    """Return the body size limit of the current view."""
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "max_body_bytes", current_app.config["REQUEST_MAX_BODY_BYTES"])
+
+
+def decode_body(model):
+    """
+    Validate the raw request body against a model in one pass.
+
+    The size limit is enforced while reading, before anything is parsed, and
+    `model_validate_json` parses and validates the bytes without building an
+    intermediate dict.
+
+    :param model: The pydantic model of the request body
+    :return: The validated model
+    :raises RequestBodyError: 413 if the body is too large, 400 if it is not
+        valid JSON for the model
+    """
+    request.max_content_length = body_limit()
+    try:
+        raw = request.get_data(cache=True)
+    except RequestEntityTooLarge:
+        raise RequestBodyError(
+            413, f"Request body exceeds {request.max_content_length} bytes"
+        )
+    if not request.is_json:
+        raise RequestBodyError(400, "Content-Type must be application/json")
+    try:
+        return model.model_validate_json(raw)
+    except ValidationError as e:
+        # e.json() renders error contexts that jsonify cannot
+        raise RequestBodyError(400, json.loads(e.json()))
+
+
+def configure_request_decoding(app):
+    """
+    Set the default body size limit and answer decoding errors uniformly.
+
+    The limit is applied to every request before its view runs, so any
+    reader of the body is refused an oversized one, not only `decode_body`.
+    """
+    app.config["REQUEST_MAX_BODY_BYTES"] = int(
+        os.getenv("REQUEST_MAX_BODY_BYTES", str(64 * 1024))
+    )
+    app.config["BATCH_MAX_IDS"] = int(os.getenv("BATCH_MAX_IDS", "500"))
+
+    @app.before_request
+    def limit_request_body():
+        request.max_content_length = body_limit()
+
+    @app.errorhandler(RequestBodyError)
+    def handle_request_body_error(e):
+        return jsonify({"data": [], "error": e.error}), e.status
+
+
+class BatchRequest(TracedModel):
+    ids: list[int] = Field(min_length=1)
+
+
+def decode_batch_ids():
+    """
+    Decode a `{"ids": [...]}` batch read body.
+
+    :return: The requested ids, de-duplicated in request order
+    :rtype: list
+    :raises RequestBodyError: 400 if the body is invalid or asks for more
+        than `BATCH_MAX_IDS` ids
+    """
+    ids = list(dict.fromkeys(decode_body(BatchRequest).ids))
+    if len(ids) > current_app.config["BATCH_MAX_IDS"]:
+        raise RequestBodyError(
+            400, f"At most {current_app.config['BATCH_MAX_IDS']} ids per batch"
+        )
+    return ids
+
+
+class PatchRequest(TracedModel):
+    """A partial update body: only the fields sent are validated and applied."""
+
+    model_config = ConfigDict(extra="forbid")
+
+
+def decode_patch(model):
+    """
+    Decode a PATCH body into the fields that were sent.
+
+    :param model: A `PatchRequest` whose fields all have defaults
+    :return: The sent fields and their validated values
+    :rtype: dict
+    :raises RequestBodyError: 400 if the body is invalid or sets no field
+    """
+    values = decode_body(model).model_dump(exclude_unset=True)
+    if not values:
+        raise RequestBodyError(400, "No fields to update")
+    return values
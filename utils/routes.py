@@ -1,9 +1,13 @@
 # app.py
+import os
+
 from controllers.customer import customer
 from controllers.menu_item import menu_item
 from controllers.order_item import order_item
 from controllers.order import order
 from controllers.payment import payment
+from controllers.debug import debug
+from controllers.health import health
 
 
 def register_routes(app):
@@ -12,3 +16,7 @@ def register_routes(app):
     app.register_blueprint(order_item, url_prefix="/order_item")
     app.register_blueprint(order, url_prefix="/order")
     app.register_blueprint(payment, url_prefix="/payment")
+    app.register_blueprint(health, url_prefix="/health")
+
+    if os.getenv("DEBUG_ENDPOINTS_ENABLED", "false").lower() == "true":
+        app.register_blueprint(debug, url_prefix="/debug")
@@ -0,0 +1,236 @@
+import fcntl
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import Response, current_app, request
+
+from db.shards import current_outlet
+
+# magic, format, status, built_at, body length, gzip length, etag length
+HEADER = struct.Struct("<4sHHdIII")
+MAGIC = b"OGSS"
+FORMAT_VERSION = 1
+COUNTER = struct.Struct("<Q")
+
+Snapshot = namedtuple(
+    "Snapshot", ["version", "status", "built_at", "body", "gzip", "etag"]
+)
+
+
+class SharedSnapshot:
+    """
+    A prebuilt response shared by every worker process on the host.
+
+    The response bytes, a gzip variant and the ETag are written atomically
+    (write to a temporary file, then rename) to a file that every worker
+    memory-maps read-only. A separate 8 byte counter file, also memory-mapped,
+    is bumped after each publish so workers know when to remap. Serving a
+    request is a counter read plus a copy out of the shared mapping.
+    """
+
+    def __init__(self, path, max_age):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._current = None
+        self._counter_file = open(f"{path}.version", "a+b")
+        if os.fstat(self._counter_file.fileno()).st_size < COUNTER.size:
+            self._counter_file.truncate(COUNTER.size)
+        self._counter = mmap.mmap(self._counter_file.fileno(), COUNTER.size)
+
+    def version(self):
+        return COUNTER.unpack_from(self._counter)[0]
+
+    def read(self):
+        """
+        Return the current snapshot, or None if it is missing or too old.
+
+        Memory views into the mapping are returned; the mapping stays alive
+        for as long as a caller holds on to them.
+        """
+        version = self.version()
+        current = self._current
+        if current is None or current.version != version:
+            current = self._remap(version)
+        if current is None or time.time() - current.built_at > self.max_age:
+            return None
+        return current
+
+    def _remap(self, version):
+        with self._lock:
+            if self._current is not None and self._current.version == version:
+                return self._current
+            try:
+                with open(self.path, "rb") as snapshot_file:
+                    mapping = mmap.mmap(
+                        snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+            except (FileNotFoundError, ValueError):
+                return None
+            magic, format_version, status, built_at, body_len, gzip_len, etag_len = (
+                HEADER.unpack_from(mapping)
+            )
+            if magic != MAGIC or format_version != FORMAT_VERSION:
+                return None
+            view = memoryview(mapping)
+            body_start = HEADER.size
+            gzip_start = body_start + body_len
+            etag_start = gzip_start + gzip_len
+            self._current = Snapshot(
+                version=version,
+                status=status,
+                built_at=built_at,
+                body=view[body_start:gzip_start],
+                gzip=view[gzip_start:etag_start],
+                etag=bytes(view[etag_start : etag_start + etag_len]).decode(),
+            )
+            return self._current
+
+    @contextmanager
+    def _publish_lock(self):
+        fcntl.flock(self._counter_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._counter_file.fileno(), fcntl.LOCK_UN)
+
+    def _publish(self, status, body):
+        compressed = gzip.compress(body, compresslevel=6, mtime=0)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'.encode()
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            status,
+            time.time(),
+            len(body),
+            len(compressed),
+            len(etag),
+        )
+        directory = os.path.dirname(self.path) or "."
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp_file:
+            temp_file.write(header + body + compressed + etag)
+        os.replace(temp_file.name, self.path)
+        COUNTER.pack_into(self._counter, 0, self.version() + 1)
+
+    def publish(self, status, body):
+        """Atomically replace the snapshot and tell every worker to remap."""
+        with self._publish_lock():
+            self._publish(status, body)
+
+    def invalidate(self, built_before=None):
+        """
+        Remove the snapshot so the next read rebuilds it.
+
+        With `built_before` (a `time.time()` value), a snapshot built after
+        that moment is kept, so workers reacting to the same change do not
+        throw away each other's rebuilds.
+        """
+        with self._publish_lock():
+            current = self.read()
+            if current is None:
+                return
+            if built_before is not None and current.built_at >= built_before:
+                return
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            COUNTER.pack_into(self._counter, 0, self.version() + 1)
+
+    def get_or_build(self, build):
+        """
+        Return the current snapshot, building it with `build()` if needed.
+
+        `build` returns (status, body bytes). Concurrent builders across
+        processes are serialized and only the first one queries the database.
+        """
+        current = self.read()
+        if current is not None:
+            return current
+        with self._publish_lock():
+            current = self.read()
+            if current is None:
+                self._publish(*build())
+                current = self.read()
+        return current
+
+
+def snapshot_response(snapshot):
+    """
+    Serve a snapshot, honouring If-None-Match and gzip Accept-Encoding.
+
+    :rtype: flask.Response
+    """
+    headers = {"ETag": snapshot.etag, "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(snapshot.etag.strip('"')):
+        return Response(status=304, headers=headers)
+    if "gzip" in request.accept_encodings:
+        headers["Content-Encoding"] = "gzip"
+        body = bytes(snapshot.gzip)
+    else:
+        body = bytes(snapshot.body)
+    return Response(
+        body, status=snapshot.status, headers=headers, mimetype="application/json"
+    )
+
+
+def default_snapshot_dir():
+    """Prefer tmpfs so the snapshot lives in shared memory."""
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def snapshot_path(directory, name, database_uri):
+    """
+    Return the snapshot file of a database.
+
+    Apps pointed at different databases must not share a snapshot.
+    """
+    database_key = hashlib.sha1(database_uri.encode()).hexdigest()[:12]
+    return os.path.join(directory, f"order_genie_{name}_{database_key}.snapshot")
+
+
+def configure_snapshots(app):
+    """Create the app's shared response snapshots."""
+    app.config["MENU_SNAPSHOT_ENABLED"] = (
+        os.getenv("MENU_SNAPSHOT_ENABLED", "true").lower() == "true"
+    )
+    app.config["MENU_SNAPSHOT_DIR"] = os.getenv(
+        "MENU_SNAPSHOT_DIR", default_snapshot_dir()
+    )
+    app.config["MENU_SNAPSHOT_MAX_AGE"] = float(
+        os.getenv("MENU_SNAPSHOT_MAX_AGE", "300")
+    )
+
+    app.extensions["snapshots"] = {}
+    if app.config["MENU_SNAPSHOT_ENABLED"]:
+        # Every outlet database gets its own snapshot, the default one under None
+        databases = {None: app.config["SQLALCHEMY_DATABASE_URI"]}
+        databases.update(app.config.get("SHARD_MAP", {}))
+        app.extensions["snapshots"]["menu"] = {
+            outlet: SharedSnapshot(
+                snapshot_path(app.config["MENU_SNAPSHOT_DIR"], "menu", database_uri),
+                max_age=app.config["MENU_SNAPSHOT_MAX_AGE"],
+            )
+            for outlet, database_uri in databases.items()
+        }
+
+
+def get_snapshot(name):
+    """
+    Return the named snapshot of the request's outlet.
+
+    Returns None when snapshots are disabled or the app is testing.
+    """
+    if current_app.testing:
+        return None
+    return current_app.extensions["snapshots"].get(name, {}).get(current_outlet())
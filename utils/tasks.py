@@ -0,0 +1,255 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Post-commit hooks by event name, e.g. "payment.created"
+HOOKS = defaultdict(list)
+
+
+def task_hook(event_name):
+    """
+    Register a function to run in the background after an event is committed.
+
+    The function receives the event payload and runs inside an app context,
+    so it can open its own `db.session`. Hooks must not rely on the request.
+    """
+
+    def register(hook):
+        HOOKS[event_name].append(hook)
+        return hook
+
+    return register
+
+
+def on_commit(session, event_name, payload):
+    """
+    Run the hooks registered for `event_name` once the session commits.
+
+    Nothing runs if the transaction is rolled back instead.
+    """
+    if not HOOKS.get(event_name) or not has_app_context():
+        return
+    executor = current_app.extensions.get("tasks")
+    if executor is not None:
+        session.info.setdefault("post_commit_tasks", []).append(
+            (executor, event_name, payload)
+        )
+
+
+def _after_commit(session):
+    for executor, event_name, payload in session.info.pop("post_commit_tasks", []):
+        for hook in HOOKS[event_name]:
+            executor.submit(f"{event_name}:{hook.__name__}", hook, payload)
+
+
+def _after_rollback(session):
+    session.info.pop("post_commit_tasks", None)
+
+
+class TaskExecutor:
+    """
+    A bounded thread pool for non-critical work that must not slow responses.
+
+    At most `max_workers + max_queue` tasks are running or queued. Once the
+    queue is full, `submit` waits up to `submit_timeout` seconds for a slot and
+    then drops the task, so a slow downstream can never exhaust memory or
+    block request threads for long.
+
+    The workers are daemon threads started on the first submit. Unlike the
+    workers of `concurrent.futures`, which the interpreter joins at exit
+    before any atexit hook runs, they cannot keep the process alive, so
+    `shutdown` decides how long to wait for them.
+    """
+
+    def __init__(self, app, max_workers, max_queue, submit_timeout):
+        self.app = app
+        self.max_workers = max_workers
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._workers = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._closed = False
+        self._metrics = defaultdict(
+            lambda: {
+                "submitted": 0,
+                "completed": 0,
+                "failed": 0,
+                "rejected": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "queue_wait_ms": 0.0,
+            }
+        )
+
+    @property
+    def eager(self):
+        """
+        Whether tasks run inline in `submit`, so tests see their effects at once.
+
+        Read on every submit, so `app.testing` set after `create_app()` counts.
+        """
+        eager = self.app.config.get("TASK_EAGER")
+        return self.app.testing if eager is None else eager
+
+    def submit(self, name, task, *args):
+        """
+        Queue `task(*args)` to run in the background.
+
+        :return: Whether the task was accepted
+        :rtype: bool
+        """
+        if self.eager:
+            self._run(name, task, args, time.perf_counter())
+            return True
+        with self._lock:
+            accepted = not self._closed
+            if accepted:
+                self._start_workers()
+                self._pending += 1
+        if accepted:
+            try:
+                self._queue.put(
+                    (name, task, args, time.perf_counter()),
+                    timeout=self.submit_timeout,
+                )
+            except queue.Full:
+                self._task_done()
+                accepted = False
+        with self._lock:
+            self._metrics[name]["submitted" if accepted else "rejected"] += 1
+        if not accepted:
+            logger.warning("Task queue full, dropped %s", name)
+        return accepted
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f"task_{len(self._workers)}",
+                daemon=True,
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._run(*item)
+            finally:
+                self._task_done()
+
+    def _task_done(self, count=1):
+        with self._lock:
+            self._pending -= count
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _run(self, name, task, args, queued_at):
+        started = time.perf_counter()
+        failed = False
+        try:
+            with self.app.app_context():
+                task(*args)
+        except Exception:
+            failed = True
+            logger.exception("Task %s failed", name)
+        duration_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            metrics = self._metrics[name]
+            metrics["failed" if failed else "completed"] += 1
+            metrics["total_ms"] += duration_ms
+            metrics["max_ms"] = max(metrics["max_ms"], duration_ms)
+            metrics["queue_wait_ms"] += (started - queued_at) * 1000
+
+    def shutdown(self, timeout):
+        """
+        Stop accepting tasks and wait up to `timeout` seconds for queued ones.
+
+        Tasks still queued when the timeout runs out are dropped, and running
+        ones are left to the daemon workers, which die with the process.
+
+        :return: The number of tasks abandoned when the timeout ran out
+        :rtype: int
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._closed = True
+            while self._pending and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+            abandoned = self._pending
+        dropped = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            dropped += 1
+        if dropped:
+            self._task_done(dropped)
+        # One stop marker per worker, taken as each of them becomes idle
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        if abandoned:
+            logger.warning("Abandoned %s background tasks on shutdown", abandoned)
+        return abandoned
+
+    def stats(self):
+        """Return the pending count and the timing counters of every task."""
+        with self._lock:
+            tasks = {}
+            for name, metrics in self._metrics.items():
+                finished = metrics["completed"] + metrics["failed"]
+                tasks[name] = {
+                    **metrics,
+                    "total_ms": round(metrics["total_ms"], 3),
+                    "max_ms": round(metrics["max_ms"], 3),
+                    "queue_wait_ms": round(metrics["queue_wait_ms"], 3),
+                    "mean_ms": (
+                        round(metrics["total_ms"] / finished, 3) if finished else 0.0
+                    ),
+                }
+            return {"pending": self._pending, "closed": self._closed, "tasks": tasks}
+
+
+def configure_tasks(app):
+    """Create the post-commit task executor and drain it when the process exits."""
+    app.config["TASK_WORKERS"] = int(os.getenv("TASK_WORKERS", "4"))
+    app.config["TASK_QUEUE_SIZE"] = int(os.getenv("TASK_QUEUE_SIZE", "256"))
+    app.config["TASK_SUBMIT_TIMEOUT"] = float(os.getenv("TASK_SUBMIT_TIMEOUT", "0.05"))
+    app.config["TASK_SHUTDOWN_TIMEOUT"] = float(
+        os.getenv("TASK_SHUTDOWN_TIMEOUT", "10")
+    )
+    # Unset means "follow app.testing", see TaskExecutor.eager
+    if "TASK_EAGER" in os.environ:
+        app.config["TASK_EAGER"] = os.environ["TASK_EAGER"].lower() == "true"
+
+    executor = TaskExecutor(
+        app,
+        max_workers=app.config["TASK_WORKERS"],
+        max_queue=app.config["TASK_QUEUE_SIZE"],
+        submit_timeout=app.config["TASK_SUBMIT_TIMEOUT"],
+    )
+    app.extensions["tasks"] = executor
+    atexit.register(executor.shutdown, app.config["TASK_SHUTDOWN_TIMEOUT"])
+
+    if not event.contains(Session, "after_commit", _after_commit):
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_rollback", _after_rollback)
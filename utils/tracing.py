@@ -0,0 +1,307 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, request
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_current_trace = ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name, parent_id, start_ns, attributes):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.attributes = attributes
+
+
+class Trace:
+    """The spans recorded for one request, rooted at a "request" span."""
+
+    def __init__(self, name, **attributes):
+        self.trace_id = os.urandom(16).hex()
+        self._epoch_ns = time.time_ns() - time.perf_counter_ns()
+        self.spans = []
+        self._stack = []
+        self.root = self.start_span(name, attributes)
+
+    def now_ns(self):
+        return self._epoch_ns + time.perf_counter_ns()
+
+    def start_span(self, name, attributes):
+        parent_id = self._stack[-1].span_id if self._stack else None
+        span_ = Span(name, parent_id, self.now_ns(), attributes)
+        self.spans.append(span_)
+        self._stack.append(span_)
+        return span_
+
+    def end_span(self, span_):
+        span_.end_ns = self.now_ns()
+        # Spans left open by an exception are closed with their parent
+        while self._stack:
+            if self._stack.pop() is span_:
+                break
+
+    def finish(self):
+        end_ns = self.now_ns()
+        for open_span in self._stack:
+            open_span.end_ns = end_ns
+        self._stack.clear()
+
+    @property
+    def duration_ms(self):
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+
+    def summary(self):
+        breakdown = {}
+        for span_ in self.spans[1:]:
+            breakdown[span_.name] = (
+                breakdown.get(span_.name, 0.0) + (span_.end_ns - span_.start_ns) / 1e6
+            )
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "attributes": self.root.attributes,
+            "duration_ms": round(self.duration_ms, 3),
+            "span_count": len(self.spans),
+            "breakdown_ms": {name: round(ms, 3) for name, ms in breakdown.items()},
+        }
+
+    def to_otlp(self, service_name="order_genie"):
+        """Return the trace in the OTLP/JSON `ExportTraceServiceRequest` shape."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [_otlp_attribute("service.name", service_name)]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [
+                                {
+                                    "traceId": self.trace_id,
+                                    "spanId": span_.span_id,
+                                    "parentSpanId": span_.parent_id or "",
+                                    "name": span_.name,
+                                    "kind": 2 if span_ is self.root else 1,
+                                    "startTimeUnixNano": str(span_.start_ns),
+                                    "endTimeUnixNano": str(span_.end_ns),
+                                    "attributes": [
+                                        _otlp_attribute(key, value)
+                                        for key, value in span_.attributes.items()
+                                    ],
+                                }
+                                for span_ in self.spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_trace():
+    """Return the trace of the current request, or None if it is not traced."""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Record a span in the current trace. A no-op for untraced requests."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    span_ = trace.start_span(name, attributes)
+    try:
+        yield span_
+    finally:
+        trace.end_span(span_)
+
+
+class TracedModel(BaseModel):
+    """
+    A pydantic model that records validation and serialization spans.
+
+    Validators and serializers are built on first use rather than at import,
+    so workers start without paying for models they may never touch.
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+    def __init__(self, /, **data):
+        if _current_trace.get() is None:
+            super().__init__(**data)
+            return
+        with span("validation", model=type(self).__name__):
+            super().__init__(**data)
+
+    @classmethod
+    def model_validate_json(cls, json_data, **kwargs):
+        if _current_trace.get() is None:
+            return super().model_validate_json(json_data, **kwargs)
+        with span("validation", model=cls.__name__):
+            return super().model_validate_json(json_data, **kwargs)
+
+    def model_dump_json(self, **kwargs):
+        if _current_trace.get() is None:
+            return super().model_dump_json(**kwargs)
+        with span("serialization", model=type(self).__name__):
+            return super().model_dump_json(**kwargs)
+
+
+class TraceBuffer:
+    """A thread-safe ring buffer of the most recent slow traces."""
+
+    def __init__(self, maxlen):
+        self._traces = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def append(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def list(self):
+        with self._lock:
+            return list(reversed(self._traces))
+
+    def find(self, trace_id):
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is not None:
+        conn.info.setdefault("trace_spans", []).append(
+            trace.start_span(
+                "sql", {"db.statement": statement[:500], "db.executemany": executemany}
+            )
+        )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace.get()
+    if trace is not None and conn.info.get("trace_spans"):
+        trace.end_span(conn.info["trace_spans"].pop())
+
+
+def _handle_error(exception_context):
+    trace = _current_trace.get()
+    connection = exception_context.connection
+    if trace is None or connection is None or not connection.info.get("trace_spans"):
+        return
+    failed_span = connection.info["trace_spans"].pop()
+    failed_span.attributes["error"] = str(exception_context.original_exception)
+    trace.end_span(failed_span)
+
+
+def _before_commit(session):
+    trace = _current_trace.get()
+    if trace is not None:
+        session.info["trace_commit_span"] = trace.start_span("commit", {})
+
+
+def _after_commit(session):
+    trace = _current_trace.get()
+    commit_span = session.info.pop("trace_commit_span", None)
+    if trace is not None and commit_span is not None:
+        trace.end_span(commit_span)
+
+
+def export_trace(path, trace):
+    """Append a trace as one line of OTLP JSON to `path`."""
+    with open(path, "a", encoding="utf-8") as export_file:
+        export_file.write(json.dumps(trace.to_otlp()) + "\n")
+
+
+def configure_tracing(app):
+    """
+    Trace a sample of requests and keep the ones slower than a threshold.
+
+    Untraced requests only pay for a context variable lookup at each
+    instrumentation point. Tracing is off unless `TRACE_SAMPLE_RATE` is set,
+    e.g. to 0.01 to trace one request in a hundred.
+    """
+    app.config["TRACE_SAMPLE_RATE"] = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    app.config["TRACE_SLOW_MS"] = float(os.getenv("TRACE_SLOW_MS", "500"))
+    app.config["TRACE_BUFFER_SIZE"] = int(os.getenv("TRACE_BUFFER_SIZE", "100"))
+    app.config["TRACE_EXPORT_PATH"] = os.getenv(
+        "TRACE_EXPORT_PATH", "logs/traces.jsonl"
+    )
+    app.extensions["traces"] = TraceBuffer(app.config["TRACE_BUFFER_SIZE"])
+
+    if app.config["TRACE_SAMPLE_RATE"] <= 0:
+        return
+
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+    if not event.contains(Session, "before_commit", _before_commit):
+        event.listen(Session, "before_commit", _before_commit)
+        event.listen(Session, "after_commit", _after_commit)
+
+    @app.before_request
+    def start_trace():
+        if random.random() >= app.config["TRACE_SAMPLE_RATE"]:
+            return
+        g.trace_token = _current_trace.set(
+            Trace(
+                "request",
+                **{
+                    "http.method": request.method,
+                    "http.route": request.endpoint or request.path,
+                },
+            )
+        )
+
+    @app.after_request
+    def record_trace_status(response):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.root.attributes["http.status_code"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_trace(exception=None):
+        token = g.pop("trace_token", None)
+        if token is None:
+            return
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        trace.finish()
+        if trace.duration_ms < app.config["TRACE_SLOW_MS"]:
+            return
+        app.extensions["traces"].append(trace)
+        try:
+            export_trace(app.config["TRACE_EXPORT_PATH"], trace)
+        except OSError as e:
+            app.logger.warning("Could not export trace %s: %s", trace.trace_id, e)
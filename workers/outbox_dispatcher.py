@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from db.outbox import claim_events, event_to_dict
+
+logger = logging.getLogger(__name__)
+
+
+class StdoutSink:
+    """Write every event as a JSON line to standard output."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, events):
+        for event in events:
+            self.stream.write(json.dumps(event) + "\n")
+        self.stream.flush()
+
+
+class FileSink:
+    """Append every event as a JSON line to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        with open(self.path, "a", encoding="utf-8") as sink_file:
+            for event in events:
+                sink_file.write(json.dumps(event) + "\n")
+            sink_file.flush()
+            os.fsync(sink_file.fileno())
+
+
+class HttpSink:
+    """POST each batch of events as a JSON array to a URL."""
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps(events).encode("utf-8")
+        http_request = urllib.request.Request(
+            self.url,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"Sink responded with HTTP {response.status}")
+
+
+SINKS = {
+    "stdout": lambda argument: StdoutSink(),
+    "file": lambda argument: FileSink(argument or "logs/outbox.jsonl"),
+    "http": lambda argument: HttpSink(argument),
+}
+
+
+def register_sink(name, factory):
+    """Register a sink factory taking the text after "name:" in the sink spec."""
+    SINKS[name] = factory
+
+
+def create_sink(spec):
+    """
+    Create a sink from a spec such as "stdout", "file:logs/outbox.jsonl" or
+    "http://localhost:8080/events".
+    """
+    if spec.startswith(("http://", "https://")):
+        return SINKS["http"](spec)
+    name, _, argument = spec.partition(":")
+    if name not in SINKS:
+        raise ValueError(f"Unknown outbox sink: {name}")
+    return SINKS[name](argument)
+
+
+def retry_delay(attempts, base_seconds, max_seconds):
+    """Exponential backoff with jitter for an event that has failed `attempts` times."""
+    delay = min(max_seconds, base_seconds * 2 ** (attempts - 1))
+    return delay + random.uniform(0, delay / 10)
+
+
+class OutboxDispatcher:
+    """
+    Deliver committed outbox events to a sink in batches.
+
+    Delivery is at-least-once: a batch is marked dispatched only after the sink
+    accepted it, and a failed batch is retried with exponential backoff until
+    `max_attempts` is reached. Sinks should be idempotent on the event id.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        sink,
+        batch_size=100,
+        max_attempts=10,
+        poll_interval=1.0,
+        backoff_base=1.0,
+        backoff_max=300.0,
+    ):
+        self.session_factory = session_factory
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stopped = threading.Event()
+
+    def dispatch_batch(self):
+        """
+        Claim, deliver and mark one batch of events.
+
+        :return: The number of events claimed
+        :rtype: int
+        """
+        with self.session_factory() as session, session.begin():
+            events = claim_events(session, self.batch_size, self.max_attempts)
+            if not events:
+                return 0
+            now = datetime.now(timezone.utc)
+            try:
+                self.sink.send([event_to_dict(event) for event in events])
+            except Exception as e:
+                logger.warning("Delivering %s outbox events failed: %s", len(events), e)
+                for event in events:
+                    event.attempts += 1
+                    event.last_error = str(e)[:1000]
+                    event.available_at = now + timedelta(
+                        seconds=retry_delay(
+                            event.attempts, self.backoff_base, self.backoff_max
+                        )
+                    )
+                    if event.attempts >= self.max_attempts:
+                        logger.error(
+                            "Giving up on outbox event %s after %s attempts",
+                            event.id,
+                            event.attempts,
+                        )
+            else:
+                for event in events:
+                    event.dispatched_at = now
+                logger.debug("Delivered %s outbox events", len(events))
+            return len(events)
+
+    def run(self):
+        """Dispatch until `stop` is called, sleeping while the outbox is drained."""
+        while not self.stopped.is_set():
+            try:
+                claimed = self.dispatch_batch()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                self.stopped.wait(self.poll_interval)
+
+    def stop(self, *args):
+        self.stopped.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dispatch outbox events")
+    parser.add_argument(
+        "--database-url", default=os.getenv("SQLALCHEMY_DATABASE_URI", "")
+    )
+    parser.add_argument("--sink", default=os.getenv("OUTBOX_SINK", "stdout"))
+    parser.add_argument(
+        "--batch-size", type=int, default=int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=float(os.getenv("OUTBOX_POLL_INTERVAL", "1.0")),
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    engine = create_engine(args.database_url)
+    dispatcher = OutboxDispatcher(
+        sessionmaker(bind=engine, expire_on_commit=False),
+        create_sink(args.sink),
+        batch_size=args.batch_size,
+        max_attempts=args.max_attempts,
+        poll_interval=args.poll_interval,
+    )
+    signal.signal(signal.SIGTERM, dispatcher.stop)
+    signal.signal(signal.SIGINT, dispatcher.stop)
+    dispatcher.run()
+
+
+if __name__ == "__main__":
+    main()